@@ -11,13 +11,42 @@ Usage:
   python3 hook.py post <tool_input_json> <tool_output>
 """
 
+import atexit
+import functools
+import hashlib
+import io
+import itertools
 import json
 import os
+import re
 import sys
+import time
 import fcntl
 from datetime import datetime
 from pathlib import Path
 
+# orjson is optional; everything flows through JSON, so use it when present
+try:
+    import orjson
+
+    def _loads(data):
+        return orjson.loads(data)
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    def _dumpb(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def _loads(data):
+        return json.loads(data)
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj)
+
+    def _dumpb(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
 CHITTER_DIR = Path.home() / ".chitter"
 WORKFLOWS_DIR = CHITTER_DIR / "workflows"
 ACTIVE_DIR = CHITTER_DIR / "active"  # Coordination files for active sessions
@@ -30,9 +59,19 @@ WORKFLOWS_DIR.mkdir(parents=True, exist_ok=True)
 ACTIVE_DIR.mkdir(parents=True, exist_ok=True)
 QUEUE_DIR.mkdir(parents=True, exist_ok=True)
 
+# Log file descriptor, opened on the first log() call and kept for the
+# process. A run's lines are collected and written with a single os.write
+# on the O_APPEND descriptor at exit (see flush_log), bypassing the io
+# layer, so concurrent hooks never interleave.
+_LOG_FD = -1
+_log_lines = []
+
 # The magic string agents must read
 COORDINATION_INSTRUCTION = "CHITTER_COORDINATION"
 
+# Divider line framing every banner the hook prints
+_BAR = "━" * 71
+
 # Default config
 DEFAULT_CONFIG = {
     # Modes:
@@ -42,6 +81,7 @@ DEFAULT_CONFIG = {
     #   "track"      - Just logs, no blocking.
     "mode": "sequential",
     "max_concurrent": 1,  # For sequential mode: how many agents can run at once
+    "block_wait_seconds": 0,  # For sequential mode: wait this long for a turn before blocking
 }
 
 # Known project roots to look for
@@ -51,55 +91,167 @@ PROJECT_ROOTS = [
     "/Projects/",
 ]
 
+# Only the head of a prompt is searched for a project path. Prompts can run
+# to tens of KB, and the paths that name the project come first.
+PROJECT_SCAN_CHARS = 4096
+
+# Compiled once at import; these run on every hook invocation.
+# Each pattern is paired with a literal it cannot match without, so the
+# common "no path in prompt" case never enters the regex engine.
+_REAL_PATH_RES = [
+    ("/Users/", re.compile(r"(/Users/[^\s\"']+)")),
+    ("/home/", re.compile(r"(/home/[^\s\"']+)")),
+    ("Goldfish", re.compile(r"([^\s\"']*Goldfish[^\s\"']+)")),
+    ("Projects/", re.compile(r"([^\s\"']*Projects/[^\s\"']+)")),
+]
+# All project roots in one pass. Each alternative is a lookahead, so matches
+# may overlap (e.g. /Projects/Goldfish/work/x) and every root is seen; the
+# group name gives the root's rank in PROJECT_ROOTS.
+_ROOT_RE = re.compile("|".join(
+    f"(?={re.escape(root)}(?P<root{rank}>[^/\\s\"']+))" for rank, root in enumerate(PROJECT_ROOTS)
+))
+_ROOT_RANKS = {f"root{rank}": rank for rank in range(len(PROJECT_ROOTS))}
+_FOLDER_RE = re.compile(r"/Users/[^/]+/[^/]+/([^/\s\"']+)")
+_SKIP_FOLDERS = frozenset({"Library", "Documents", "Desktop", "Downloads", ".claude", ".chitter"})
+
 
 def extract_project_from_prompt(prompt: str) -> tuple[str, str]:
     """Try to extract project name and path from file paths mentioned in the prompt."""
-    import re
-
-    real_path_patterns = [
-        r"(/Users/[^\s\"']+)",
-        r"(/home/[^\s\"']+)",
-        r"([^\s\"']*Goldfish[^\s\"']+)",
-        r"([^\s\"']*Projects/[^\s\"']+)",
-    ]
+    prompt = prompt[:PROJECT_SCAN_CHARS]
+    has_users = "/Users/" in prompt
+    if not (has_users or "/home/" in prompt or "Goldfish" in prompt or "Projects/" in prompt):
+        return "unknown", ""
 
     first_path = ""
-    for pattern in real_path_patterns:
-        match = re.search(pattern, prompt)
+    for literal, pattern in _REAL_PATH_RES:
+        if literal not in prompt:
+            continue
+        match = pattern.search(prompt)
         if match:
             first_path = match.group(1)
             break
 
-    for root in PROJECT_ROOTS:
-        pattern = re.escape(root) + r"([^/\s\"']+)"
-        match = re.search(pattern, prompt)
-        if match:
-            return match.group(1), first_path
+    # Earliest root in PROJECT_ROOTS wins, wherever it appears in the prompt
+    project, best = None, len(PROJECT_ROOTS)
+    for match in _ROOT_RE.finditer(prompt):
+        rank = _ROOT_RANKS[match.lastgroup]
+        if rank < best:
+            project, best = match.group(match.lastgroup), rank
+            if rank == 0:
+                break
+    if project:
+        return project, first_path
 
-    folder_match = re.search(r"/Users/[^/]+/[^/]+/([^/\s\"']+)", prompt)
+    if not has_users:
+        return "unknown", first_path
+
+    folder_match = _FOLDER_RE.search(prompt)
     if folder_match:
         folder = folder_match.group(1)
-        if folder not in ["Library", "Documents", "Desktop", "Downloads", ".claude", ".chitter"]:
+        if folder not in _SKIP_FOLDERS:
             return folder, first_path
 
     return "unknown", first_path
 
 
+_log_second = -1
+_log_stamp = ""
+
+
 def log(message: str) -> None:
     """Append to log file."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    with open(LOG_FILE, "a") as f:
-        f.write(f"[{timestamp}] {message}\n")
+    global _LOG_FD, _log_second, _log_stamp
+    if _LOG_FD < 0:
+        _LOG_FD = os.open(LOG_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        atexit.register(os.close, _LOG_FD)
+        atexit.register(flush_log)  # Runs before the close
+    # A hook run logs several lines within the same second; format once
+    now = int(time.time())
+    if now != _log_second:
+        _log_second, _log_stamp = now, time.strftime("%H:%M:%S", time.localtime(now))
+    _log_lines.append(f"[{_log_stamp}] {message}\n")
+
+
+def flush_log() -> None:
+    """Write the lines logged so far in one write."""
+    if _log_lines:
+        os.write(_LOG_FD, "".join(_log_lines).encode())
+        _log_lines.clear()
+
+
+_now_iso = ""
+
+
+def now_iso() -> str:
+    """ISO timestamp for this hook run, taken once on first use.
+
+    A hook run normally lasts milliseconds, so everything it records shares
+    one stamp. A run that waits for its turn (wait_for_turn) calls
+    refresh_now_iso() once the wait is over.
+    """
+    global _now_iso
+    if not _now_iso:
+        _now_iso = datetime.now().isoformat()
+    return _now_iso
+
+
+def refresh_now_iso() -> None:
+    """Drop the cached stamp so the next now_iso() reads the clock again."""
+    global _now_iso
+    _now_iso = ""
+
+
+# (mtime_ns, merged config) of the last config file read
+_config_cache = (None, DEFAULT_CONFIG)
 
 
 def get_config() -> dict:
-    """Load config or return defaults."""
-    if CONFIG_FILE.exists():
+    """Load config or return defaults (re-read only when the file changes)."""
+    global _config_cache
+    try:
+        mtime = CONFIG_FILE.stat().st_mtime_ns
+    except OSError:
+        return DEFAULT_CONFIG
+    if mtime != _config_cache[0]:
         try:
-            return {**DEFAULT_CONFIG, **json.loads(CONFIG_FILE.read_text())}
-        except:
-            pass
-    return DEFAULT_CONFIG
+            config = {**DEFAULT_CONFIG, **_loads(CONFIG_FILE.read_bytes())}
+        except (OSError, ValueError, TypeError):
+            config = DEFAULT_CONFIG
+        _config_cache = (mtime, config)
+    return _config_cache[1]
+
+
+def read_json_file(path: Path) -> dict:
+    """Read and parse a workflow or queue file as raw bytes in one read."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return _loads(os.read(fd, os.fstat(fd).st_size))
+    finally:
+        os.close(fd)
+
+
+def write_file_atomic(path: Path, *chunks: bytes) -> None:
+    """Write chunks to a per-process temp file and rename it over path.
+
+    The chunks go out in one writev, and lock-free readers (agents, the
+    server) see either the old file or the new one, never a partial write.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        written = os.writev(fd, chunks)
+        if written < sum(map(len, chunks)):
+            data = memoryview(b"".join(chunks))[written:]
+            while data:
+                data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+
+def write_json_file(path: Path, state: dict) -> None:
+    """Serialize workflow or queue state as compact JSON and write it out atomically."""
+    write_file_atomic(path, _dumpb(state))
 
 
 # ============================================================================
@@ -123,393 +275,691 @@ class QueueLock:
         self.fd = None
 
     def __enter__(self):
-        self.lock_file.touch(exist_ok=True)
-        self.fd = open(self.lock_file, 'w')
+        # One open(O_CREAT) on a raw descriptor; no touch, no file object
+        self.fd = os.open(self.lock_file, os.O_WRONLY | os.O_CREAT, 0o644)
         fcntl.flock(self.fd, fcntl.LOCK_EX)  # Exclusive lock, blocks until acquired
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.fd:
-            fcntl.flock(self.fd, fcntl.LOCK_UN)
-            self.fd.close()
+        if self.fd is not None:
+            # Closing the descriptor releases the lock
+            os.close(self.fd)
+            self.fd = None
         return False
 
 
-def get_queue(session_id: str) -> dict:
-    """Get or create queue state for a session."""
+# session_id -> (file identity, queue) for the last queue read or written.
+# Lets the several unlocked queue lookups in one hook run share one parse.
+# Never trusted under QueueLock: inodes get reused and mtimes are coarse, so
+# a matching identity can still hide another hook's replacement.
+_queue_cache: dict[str, tuple[tuple, dict]] = {}
+
+
+def _file_identity(path: Path) -> tuple:
+    """Something that changes whenever the file is replaced or rewritten."""
+    st = os.stat(path)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def get_queue(session_id: str, fresh: bool = False) -> dict:
+    """Get or create queue state for a session.
+
+    Read-modify-write callers holding QueueLock pass fresh=True to always
+    read the file rather than the cached parse.
+    """
     queue_file = get_queue_file(session_id)
-    if queue_file.exists():
-        try:
-            return json.loads(queue_file.read_text())
-        except:
-            pass
+    try:
+        identity = _file_identity(queue_file)
+        cached = _queue_cache.get(session_id)
+        if not fresh and cached and cached[0] == identity:
+            return cached[1]
+        queue = read_json_file(queue_file)
+        if "id_index" not in queue:
+            # Queue written before the index existed
+            queue["id_index"] = {a["id"]: a["position"] for a in queue["agents"]}
+        _queue_cache[session_id] = (identity, queue)
+        return queue
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
     return {
         "session_id": session_id,
         "agents": [],  # List of {id, type, task, status, position, queued_at}
+        "id_index": {},  # Agent id -> position, i.e. its index in agents
         "current_position": 0,  # Which position is currently allowed to run
-        "created_at": datetime.now().isoformat()
+        "created_at": now_iso()
     }
 
 
 def save_queue(session_id: str, queue: dict) -> None:
-    """Save queue state."""
+    """Save queue state (atomic write; is_turn and friends read it unlocked)."""
     queue_file = get_queue_file(session_id)
-    queue_file.write_text(json.dumps(queue, indent=2))
+    write_json_file(queue_file, queue)
+    _queue_cache[session_id] = (_file_identity(queue_file), queue)
 
 
-def add_to_queue(session_id: str, agent_id: str, agent_type: str, task: str) -> int:
-    """Add an agent to the queue. Returns its position (0-indexed)."""
-    with QueueLock(session_id):
-        queue = get_queue(session_id)
+def _enqueue(session_id: str, queue: dict, agent_id: str, agent_type: str, task: str) -> int:
+    """Append an agent to a loaded queue. Returns its position (0-indexed).
 
-        # Check if already in queue (retry case)
-        for agent in queue["agents"]:
-            if agent["id"] == agent_id:
-                return agent["position"]
+    An agent that is already queued (retry case) keeps its position.
+    """
+    if agent_id in queue["id_index"]:
+        return queue["id_index"][agent_id]
 
-        position = len(queue["agents"])
-        queue["agents"].append({
-            "id": agent_id,
-            "type": agent_type,
-            "task": task,
-            "status": "queued",
-            "position": position,
-            "queued_at": datetime.now().isoformat()
-        })
-        save_queue(session_id, queue)
-        log(f"[{session_id}] QUEUE: Added {agent_type} at position {position}")
+    position = len(queue["agents"])
+    queue["agents"].append({
+        "id": agent_id,
+        "type": agent_type,
+        "task": task,
+        "status": "queued",
+        "position": position,
+        "queued_at": now_iso()
+    })
+    queue["id_index"][agent_id] = position
+    log(f"[{session_id}] QUEUE: Added {agent_type} at position {position}")
+    return position
+
+
+def add_to_queue(session_id: str, agent_id: str, agent_type: str, task: str, status: str = "queued") -> int:
+    """Add an agent to the queue. Returns its position (0-indexed).
+
+    A status other than "queued" is applied in the same locked update, so
+    an agent can be queued and started without a second load-mutate-save.
+    """
+    with QueueLock(session_id):
+        queue = get_queue(session_id, fresh=True)
+        is_retry = agent_id in queue["id_index"]
+        position = _enqueue(session_id, queue, agent_id, agent_type, task)
+        if status != "queued":
+            _set_status(queue, queue["agents"][position], status)
+        if status != "queued" or not is_retry:
+            save_queue(session_id, queue)
         return position
 
 
+def _find_position(queue: dict, agent_id: str) -> int | None:
+    """An agent's position in an already loaded queue."""
+    return queue["id_index"].get(agent_id)
+
+
+def _find_agent(queue: dict, agent_id: str) -> dict | None:
+    """An agent's queue entry, looked up through id_index."""
+    position = queue["id_index"].get(agent_id)
+    return queue["agents"][position] if position is not None else None
+
+
 def get_queue_position(session_id: str, agent_id: str) -> int | None:
     """Get an agent's position in the queue."""
-    queue = get_queue(session_id)
-    for agent in queue["agents"]:
-        if agent["id"] == agent_id:
-            return agent["position"]
-    return None
+    return _find_position(get_queue(session_id), agent_id)
+
+
+def _unfinished_ahead(queue: dict, position: int) -> list[dict]:
+    """Agents queued before position that aren't complete.
+
+    Every agent below current_position is complete, so only the slice from
+    there up to position is looked at. "blocked" and "queued" both count as
+    "not done yet".
+    """
+    start = min(queue.get("current_position", 0), position)
+    return [a for a in queue["agents"][start:position] if a["status"] != "complete"]
 
 
 def is_turn(session_id: str, agent_id: str, max_concurrent: int = 1) -> bool:
     """Check if it's this agent's turn to run."""
-    queue = get_queue(session_id)
-    position = get_queue_position(session_id, agent_id)
+    return _is_turn(get_queue(session_id), agent_id, max_concurrent)
+
+
+def _is_turn(queue: dict, agent_id: str, max_concurrent: int) -> bool:
+    """is_turn against an already loaded queue."""
+    position = _find_position(queue, agent_id)
 
     if position is None:
         return True  # Not in queue, allow
 
-    # Count how many agents before this one are still not complete
-    # "blocked" and "queued" both count as "not done yet"
-    agents_ahead = 0
-    for agent in queue["agents"]:
-        if agent["position"] < position and agent["status"] not in ("complete",):
-            agents_ahead += 1
+    # Fewer agents between the first unfinished one and us than max_concurrent
+    # means fewer than that can still be ahead, without looking at them
+    if position - queue.get("current_position", 0) < max_concurrent:
+        return True
 
     # It's our turn if fewer than max_concurrent agents are ahead
-    return agents_ahead < max_concurrent
+    return len(_unfinished_ahead(queue, position)) < max_concurrent
 
 
-def mark_agent_running(session_id: str, agent_id: str) -> None:
-    """Mark an agent as currently running."""
-    with QueueLock(session_id):
-        queue = get_queue(session_id)
-        for agent in queue["agents"]:
-            if agent["id"] == agent_id:
-                agent["status"] = "running"
-                agent["started_at"] = datetime.now().isoformat()
-                break
-        save_queue(session_id, queue)
+def wait_for_turn(session_id: str, agent_id: str, max_concurrent: int, timeout: float) -> bool:
+    """Wait up to timeout seconds for a blocked agent's turn.
 
+    Polls the queue file with backoff and only re-checks the queue when it
+    has changed. Marks the agent running and returns True if its turn comes.
+    """
+    if not timeout or timeout <= 0:
+        return False
 
-def mark_agent_complete(session_id: str, agent_id: str) -> bool:
-    """Mark an agent as complete. Returns False if agent wasn't running (was blocked)."""
-    with QueueLock(session_id):
-        queue = get_queue(session_id)
-        for agent in queue["agents"]:
-            if agent["id"] == agent_id:
-                # Only mark complete if it was actually running (not blocked)
-                if agent["status"] != "running":
-                    log(f"[{session_id}] QUEUE: {agent_id} POST fired but status was '{agent['status']}' - not marking complete")
-                    return False
-                agent["status"] = "complete"
-                agent["completed_at"] = datetime.now().isoformat()
-                break
-        save_queue(session_id, queue)
-        log(f"[{session_id}] QUEUE: {agent_id} complete")
-        return True
+    queue_file = get_queue_file(session_id)
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    try:
+        seen = _file_identity(queue_file)
+    except OSError:
+        seen = None
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.1)
+
+        try:
+            identity = _file_identity(queue_file)
+        except OSError:
+            continue
+        if identity == seen:
+            continue
+        seen = identity
+
+        with QueueLock(session_id):
+            queue = get_queue(session_id, fresh=True)
+            agent = _find_agent(queue, agent_id)
+            if agent is None or agent["status"] != "blocked":
+                return False  # Dropped or picked up by a retry meanwhile
+            if _is_turn(queue, agent_id, max_concurrent):
+                refresh_now_iso()  # Start times are now, not when we queued
+                _set_status(queue, agent, "running")
+                save_queue(session_id, queue)
+                return True
+
+
+def _advance_current_position(queue: dict) -> None:
+    """Move current_position past the completed agents at the head of the queue."""
+    agents = queue["agents"]
+    current = queue.get("current_position", 0)
+    while current < len(agents) and agents[current]["status"] == "complete":
+        current += 1
+    queue["current_position"] = current
+
+
+def _reopen_position(queue: dict, position: int) -> None:
+    """Keep current_position at or below an agent that is no longer complete."""
+    if position < queue.get("current_position", 0):
+        queue["current_position"] = position
+
+
+# Timestamp recorded when an agent enters a status
+_STATUS_TIMESTAMPS = {"running": "started_at", "complete": "completed_at"}
+
+
+def _set_status(queue: dict, agent: dict, status: str) -> None:
+    """Apply a status change to a loaded queue entry, keeping current_position valid."""
+    agent["status"] = status
+    stamp = _STATUS_TIMESTAMPS.get(status)
+    if stamp:
+        agent[stamp] = now_iso()
+    if status == "complete":
+        _advance_current_position(queue)
+    else:
+        _reopen_position(queue, agent["position"])
 
 
-def mark_agent_blocked(session_id: str, agent_id: str) -> None:
-    """Mark an agent as blocked (waiting in queue)."""
+def transition_agent(session_id: str, agent_id: str, status: str, require_status: str = None) -> str | None:
+    """Move a queued agent to a new status in one locked load-mutate-save.
+
+    With require_status, the agent is left alone unless it currently has that
+    status. Returns the agent's previous status, or None if it isn't queued.
+    """
     with QueueLock(session_id):
-        queue = get_queue(session_id)
-        for agent in queue["agents"]:
-            if agent["id"] == agent_id:
-                agent["status"] = "blocked"
-                break
+        queue = get_queue(session_id, fresh=True)
+        agent = _find_agent(queue, agent_id)
+        previous = agent["status"] if agent else None
+        if agent:
+            if require_status and previous != require_status:
+                return previous
+            _set_status(queue, agent, status)
         save_queue(session_id, queue)
+        return previous
+
+
+def mark_agent_complete(session_id: str, agent_id: str) -> bool:
+    """Mark an agent as complete. Returns False if agent wasn't running (was blocked)."""
+    # Only mark complete if it was actually running (not blocked)
+    previous = transition_agent(session_id, agent_id, "complete", require_status="running")
+    if previous not in (None, "running"):
+        log(f"[{session_id}] QUEUE: {agent_id} POST fired but status was '{previous}' - not marking complete")
+        return False
+    log(f"[{session_id}] QUEUE: {agent_id} complete")
+    return True
 
 
 def get_agents_ahead(session_id: str, agent_id: str) -> list[dict]:
     """Get list of agents ahead of this one that aren't complete."""
     queue = get_queue(session_id)
-    position = get_queue_position(session_id, agent_id)
+    position = _find_position(queue, agent_id)
 
     if position is None:
         return []
 
-    ahead = []
-    for agent in queue["agents"]:
-        if agent["position"] < position and agent["status"] not in ("complete",):
-            ahead.append(agent)
-    return ahead
+    return _unfinished_ahead(queue, position)
 
 
 def get_completed_agents(session_id: str) -> list[dict]:
     """Get list of completed agents in order."""
-    queue = get_queue(session_id)
-    completed = [a for a in queue["agents"] if a["status"] == "complete"]
-    return sorted(completed, key=lambda x: x["position"])
+    # add_to_queue appends at position len(agents), so the list is already in order
+    return [a for a in get_queue(session_id)["agents"] if a["status"] == "complete"]
 
 
 # ============================================================================
 # COORDINATION FILE
 # ============================================================================
 
+@functools.lru_cache(maxsize=64)
 def get_coordination_file(session_id: str) -> Path:
     """Get the path to the coordination file for a session."""
     return ACTIVE_DIR / f"{session_id}.md"
 
 
+# Invariant parts of the coordination file, joined once at import
+_COORD_STATUS_HEADER = "\n".join([
+    "",
+    "**Read this before starting your work.**",
+    "",
+    "## Telephone Game Status",
+    "",
+    "| # | Agent | Status |",
+    "|---|-------|--------|",
+])
+
+_COORD_RULES_BLOCK = "\n".join([
+    "## IMPORTANT: Build On Previous Work",
+    "",
+    "1. **Read decisions above** - Previous agents made these choices. Use them.",
+    "2. **Add your perspective** - What can you contribute that builds on their work?",
+    "3. **Be explicit** - State your decisions clearly for agents after you.",
+    "4. **No contradictions** - If you disagree with a previous decision, note it but don't change it.",
+    "",
+    "---",
+])
+
+
+def get_coordination_hash_file(session_id: str) -> Path:
+    """Get the file holding the digest of the last coordination state written."""
+    return ACTIVE_DIR / f"{session_id}.hash"
+
+
 def write_coordination_state(session_id: str, workflow: dict, new_agent_type: str, new_agent_task: str) -> None:
-    """Write current coordination state to the session's coordination file."""
-    coord_file = get_coordination_file(session_id)
+    """Write current coordination state to the session's coordination file.
 
-    agents = workflow.get("agents", {})
-    completed_agents = [(aid, a) for aid, a in agents.items() if a.get("status") == "complete"]
+    Runs under the workflow lock and renders from the workflow file as it is
+    now, so a slower concurrent hook can't replace the file with an older
+    view that is missing agents completed in the meantime.
+    """
+    with WorkflowLock(workflow["workflow_id"]):
+        try:
+            workflow = read_json_file(WORKFLOWS_DIR / f"{workflow['workflow_id']}.json")
+        except (OSError, ValueError):
+            pass
+        _write_coordination_state(session_id, workflow, new_agent_type, new_agent_task)
 
-    # Get queue to show proper positions
-    queue = get_queue(session_id)
-    agent_positions = {a["id"]: a["position"] for a in queue.get("agents", [])}
 
-    # Sort completed agents by position
-    completed_agents_sorted = sorted(completed_agents, key=lambda x: agent_positions.get(x[0], 99))
+def _write_coordination_state(session_id: str, workflow: dict, new_agent_type: str, new_agent_task: str) -> None:
+    """write_coordination_state body; the caller holds the workflow lock."""
+    coord_file = get_coordination_file(session_id)
+
+    # Get queue to show proper positions
+    agent_positions = get_queue(session_id)["id_index"]
+
+    # Single pass: pick out completed agents and resolve each one's position
+    # once as (sort key, display number, agent). Agents that never went
+    # through the queue (block/track modes) sort last and display as "?".
+    completed_agents_sorted = []
+    for aid, agent in workflow.get("agents", {}).items():
+        if agent.get("status") == "complete":
+            pos = agent_positions.get(aid)
+            if pos is None:
+                completed_agents_sorted.append((99, "?", agent))
+            else:
+                completed_agents_sorted.append((pos, pos + 1, agent))
+    completed_agents_sorted.sort(key=lambda x: x[0])
     next_position = len(completed_agents_sorted) + 1
 
-    lines = [
-        f"# CHITTER COORDINATION - Session {session_id}",
-        "",
-        f"**Read this before starting your work.**",
-        "",
-        f"## Telephone Game Status",
-        f"",
-        f"| # | Agent | Status |",
-        f"|---|-------|--------|",
-    ]
+    buf = io.StringIO()
+    w = buf.write
+    w(f"# CHITTER COORDINATION - Session {session_id}\n{_COORD_STATUS_HEADER}\n")
 
     # Show completed agents in the status table
-    for aid, agent in completed_agents_sorted:
-        pos = agent_positions.get(aid, "?")
-        agent_type = agent.get('subagent_type', 'unknown')
-        lines.append(f"| {pos + 1} | {agent_type} | ✅ Complete |")
+    for _, number, agent in completed_agents_sorted:
+        w(f"| {number} | {agent.get('subagent_type', 'unknown')} | ✅ Complete |\n")
 
-    lines.append(f"| {next_position} | **{new_agent_type}** | 🔄 Running (YOU) |")
-    lines.append("")
-
-    lines.extend([
-        "## Your Task",
-        f"You are: **{new_agent_type}** (Agent #{next_position})",
-        f"Task: {new_agent_task}",
-        "",
-    ])
+    w(f"| {next_position} | **{new_agent_type}** | 🔄 Running (YOU) |\n\n"
+      f"## Your Task\n"
+      f"You are: **{new_agent_type}** (Agent #{next_position})\n"
+      f"Task: {new_agent_task}\n\n")
 
     # Completed agents and their decisions (the "telephone" context)
     if completed_agents_sorted:
-        lines.append("## Previous Agents (build on their work)")
-        lines.append("")
-        for aid, agent in completed_agents_sorted:
-            pos = agent_positions.get(aid, "?")
-            agent_type = agent.get('subagent_type', 'unknown')
-            lines.append(f"### Agent #{pos + 1}: {agent_type}")
-            lines.append(f"Task: {agent.get('task', 'no description')}")
+        w("## Previous Agents (build on their work)\n\n")
+        for _, number, agent in completed_agents_sorted:
+            w(f"### Agent #{number}: {agent.get('subagent_type', 'unknown')}\n"
+              f"Task: {agent.get('task', 'no description')}\n")
             decisions = agent.get("decisions", [])
             if decisions:
-                lines.append("")
-                lines.append("**Key decisions:**")
-                for d in decisions[:10]:
-                    lines.append(f"- {d}")
-            lines.append("")
-
-    lines.extend([
-        "## IMPORTANT: Build On Previous Work",
-        "",
-        "1. **Read decisions above** - Previous agents made these choices. Use them.",
-        "2. **Add your perspective** - What can you contribute that builds on their work?",
-        "3. **Be explicit** - State your decisions clearly for agents after you.",
-        "4. **No contradictions** - If you disagree with a previous decision, note it but don't change it.",
-        "",
-        "---",
-        f"*Generated by Chitter at {datetime.now().isoformat()}*",
-    ])
-
-    coord_file.write_text("\n".join(lines))
+                w("\n**Key decisions:**\n")
+                w("".join(f"- {d}\n" for d in decisions[:10]))
+            w("\n")
+
+    w(_COORD_RULES_BLOCK)
+
+    # Skip the rewrite when nothing but the timestamp footer would change
+    content = buf.getvalue().encode()
+    digest = hashlib.blake2b(content, digest_size=8).hexdigest()
+    hash_file = get_coordination_hash_file(session_id)
+    try:
+        if coord_file.exists() and hash_file.read_text() == digest:
+            return
+    except OSError:
+        pass
+
+    write_file_atomic(coord_file, content, f"\n*Generated by Chitter at {now_iso()}*".encode())
+    hash_file.write_text(digest)
 
 
 def prompt_has_coordination(prompt: str) -> bool:
     """Check if the prompt includes coordination instruction."""
-    return COORDINATION_INSTRUCTION in prompt or "~/.chitter/active/" in prompt or ".chitter/active/" in prompt
+    # ".chitter/active/" also covers "~/.chitter/active/"
+    return COORDINATION_INSTRUCTION in prompt or ".chitter/active/" in prompt
 
 
 # ============================================================================
 # WORKFLOW MANAGEMENT (kept for decision extraction)
 # ============================================================================
 
+def get_workflow_pointer(session_id: str) -> Path:
+    """Get the file recording which workflow is active for a session."""
+    return ACTIVE_DIR / f"{session_id}.workflow"
+
+
+class WorkflowLock(QueueLock):
+    """File-based lock serializing hook updates to one workflow file.
+
+    Only hooks take it; the MCP server's save_workflow does not, so server
+    writes can still interleave with a hook's. The server removes the
+    <id>.lock file when it deletes the workflow.
+    """
+    def __init__(self, workflow_id: str):
+        self.lock_file = WORKFLOWS_DIR / f"{workflow_id}.lock"
+        self.fd = None
+
+
+class SessionWorkflowLock(QueueLock):
+    """File-based lock serializing creation of a session's workflow."""
+    def __init__(self, session_id: str):
+        self.lock_file = ACTIVE_DIR / f"{session_id}.workflow.lock"
+        self.fd = None
+
+
 def get_active_workflow(session_id: str = None) -> dict | None:
-    """Get the currently active workflow for this session."""
-    for path in WORKFLOWS_DIR.glob("*.json"):
+    """Get the currently active workflow for this session.
+
+    Session lookups go through the pointer written by get_or_create_workflow: one
+    small read plus the workflow itself, however many workflows exist.
+    """
+    if session_id:
         try:
-            workflow = json.loads(path.read_text())
-            if workflow.get("status") == "active":
-                if session_id and workflow.get("session_id") != session_id:
-                    continue
-                return workflow
-        except:
-            pass
+            workflow_id = get_workflow_pointer(session_id).read_text().strip()
+            workflow = read_json_file(WORKFLOWS_DIR / f"{workflow_id}.json")
+        except (OSError, ValueError):
+            return None
+        return workflow if workflow.get("status") == "active" else None
+
+    # No session to look up: return the first active workflow on disk
+    with os.scandir(WORKFLOWS_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                workflow = read_json_file(entry.path)
+                if workflow.get("status") == "active":
+                    return workflow
+            except (OSError, ValueError):
+                pass
     return None
 
 
 def create_workflow(description: str, session_id: str = "unknown") -> dict:
-    """Create a new workflow scoped to a session."""
-    import uuid
-    workflow_id = str(uuid.uuid4())[:8]
+    """Create a new workflow scoped to a session.
+
+    Only builds the record; get_or_create_workflow persists it along with
+    the session's pointer.
+    """
+    workflow_id = os.urandom(4).hex()
     workflow = {
         "workflow_id": workflow_id,
         "session_id": session_id,
         "description": description,
         "status": "active",
         "agents": {},
-        "created_at": datetime.now().isoformat(),
+        "created_at": now_iso(),
         "created_by": "hook"
     }
-    path = WORKFLOWS_DIR / f"{workflow_id}.json"
-    path.write_text(json.dumps(workflow, indent=2))
     log(f"[{session_id}] WORKFLOW CREATED: {workflow_id}")
     return workflow
 
 
-def add_agent_to_workflow(workflow: dict, agent_id: str, task: str, subagent_type: str) -> None:
-    """Add an agent to the workflow."""
-    path = WORKFLOWS_DIR / f"{workflow['workflow_id']}.json"
-    session_id = workflow.get("session_id", "unknown")
+def get_or_create_workflow(session_id: str, description: str) -> dict:
+    """The session's active workflow, creating and persisting one if there is none.
 
-    try:
-        current = json.loads(path.read_text())
-    except:
-        current = workflow
+    Concurrent first hooks of a session would otherwise each create their own
+    workflow, and whichever pointer landed last would orphan the others.
+    """
+    workflow = get_active_workflow(session_id)
+    if workflow:
+        return workflow
 
-    current["agents"][agent_id] = {
-        "task": task,
-        "subagent_type": subagent_type,
-        "status": "working",
-        "started_at": datetime.now().isoformat(),
-        "decisions": []
-    }
-    path.write_text(json.dumps(current, indent=2))
+    with SessionWorkflowLock(session_id):
+        # Another hook may have created it while we waited for the lock
+        workflow = get_active_workflow(session_id)
+        if not workflow:
+            workflow = create_workflow(description, session_id)
+            write_json_file(WORKFLOWS_DIR / f"{workflow['workflow_id']}.json", workflow)
+            write_file_atomic(get_workflow_pointer(session_id), workflow["workflow_id"].encode())
+    return workflow
+
+
+def add_agent_to_workflow(workflow: dict, agent_id: str, task: str, subagent_type: str) -> dict | None:
+    """Add an agent to the workflow. Returns the workflow as written.
+
+    Returns None without writing if the workflow file is gone (deleted or
+    cleaned up since it was read), rather than resurrecting it.
+    """
+    path = WORKFLOWS_DIR / f"{workflow['workflow_id']}.json"
 
+    with WorkflowLock(workflow["workflow_id"]):
+        # Re-read under the lock so concurrent hooks don't drop each other's agents
+        try:
+            current = read_json_file(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            current = workflow
 
-def complete_agent(workflow: dict, agent_id: str, output) -> None:
-    """Mark agent as complete and extract decisions."""
+        current["agents"][agent_id] = {
+            "task": task,
+            "subagent_type": subagent_type,
+            "status": "working",
+            "started_at": now_iso(),
+            "decisions": []
+        }
+        working = current.setdefault("by_type_working", {}).setdefault(subagent_type, [])
+        if agent_id not in working:
+            working.append(agent_id)
+        write_json_file(path, current)
+    return current
+
+
+def register_agent(workflow: dict, session_id: str, agent_id: str, task: str, subagent_type: str) -> None:
+    """Add an agent to the workflow and publish the coordination file for it."""
+    current = add_agent_to_workflow(workflow, agent_id, task, subagent_type)
+    if current:
+        write_coordination_state(session_id, current, subagent_type, task)
+
+
+def complete_agent(workflow: dict, agent_id: str, output) -> dict | None:
+    """Mark agent as complete and extract decisions. Returns the workflow as written."""
     path = WORKFLOWS_DIR / f"{workflow['workflow_id']}.json"
     session_id = workflow.get("session_id", "unknown")
 
-    try:
-        current = json.loads(path.read_text())
-    except:
-        current = workflow
+    if not isinstance(output, (str, dict)):
+        output = str(output) if output else ""
 
-    if agent_id not in current["agents"]:
-        return
+    # Parse the output before taking the lock; it doesn't depend on the file.
+    # A dict response goes to the extractor as-is; no serialize/parse round trip
+    output_summary = summarize_output(output)
+    decisions = extract_decisions(output)
 
-    current["agents"][agent_id]["status"] = "complete"
-    current["agents"][agent_id]["completed_at"] = datetime.now().isoformat()
+    with WorkflowLock(workflow["workflow_id"]):
+        try:
+            current = read_json_file(path)
+        except (OSError, ValueError):
+            current = workflow
+
+        if agent_id not in current["agents"]:
+            return None
+
+        agent = current["agents"][agent_id]
+        agent["status"] = "complete"
+        agent["completed_at"] = now_iso()
+        agent["output_summary"] = output_summary
+        agent["decisions"] = decisions
+        working = current.get("by_type_working", {}).get(agent.get("subagent_type"))
+        if working and agent_id in working:
+            working.remove(agent_id)
+        write_json_file(path, current)
 
-    if isinstance(output, str):
-        output_str = output
-    elif isinstance(output, dict):
-        output_str = json.dumps(output)
-    else:
-        output_str = str(output) if output else ""
+    log(f"[{session_id}] AGENT COMPLETE: {agent_id} - {len(decisions)} decisions extracted")
+    return current
 
-    current["agents"][agent_id]["output_summary"] = output_str[:2000] if output_str else ""
 
-    decisions = extract_decisions(output_str)
-    current["agents"][agent_id]["decisions"] = decisions
+def find_working_agent(workflow: dict, subagent_type: str) -> str | None:
+    """Oldest still-working agent of a type, via the workflow's by_type_working index.
 
-    path.write_text(json.dumps(current, indent=2))
-    log(f"[{session_id}] AGENT COMPLETE: {agent_id} - {len(decisions)} decisions extracted")
+    Entries are checked against the agent records, since the server can
+    complete agents without touching the index. Workflows written before the
+    index existed are scanned instead.
+    """
+    agents = workflow.get("agents", {})
+    if "by_type_working" not in workflow:
+        candidates = (aid for aid, a in agents.items() if a.get("subagent_type") == subagent_type)
+    else:
+        candidates = workflow["by_type_working"].get(subagent_type, ())
+    for aid in candidates:
+        if agents.get(aid, {}).get("status") == "working":
+            return aid
+    return None
 
 
-def extract_actual_content(output: str) -> str:
-    """Extract actual text content from Claude's response format."""
+def summarize_output(output: str | dict, limit: int = 2000) -> str:
+    """Bounded summary of an agent's output.
+
+    Dict responses are reduced to their text parts before slicing, so a large
+    response is never serialized in full just to keep its first 2000 chars.
+    """
     if not output:
         return ""
+    if isinstance(output, dict):
+        return extract_actual_content(output)[:limit]
+    return output[:limit]
 
-    try:
-        data = json.loads(output)
-        if isinstance(data, dict) and "content" in data:
-            content = data["content"]
-            if isinstance(content, list):
-                texts = [c.get("text", "") for c in content if isinstance(c, dict) and c.get("type") == "text"]
-                return "\n".join(texts)
-        if isinstance(data, dict) and "text" in data:
-            return data["text"]
-    except:
-        pass
 
-    return output
+def extract_actual_content(output: str | dict) -> str:
+    """Extract actual text content from Claude's response format.
 
+    Accepts the raw response string or an already-parsed response dict.
+    """
+    if not output:
+        return ""
 
-def extract_decisions(output: str) -> list[str]:
+    if isinstance(output, dict):
+        data = output
+    else:
+        # Plain-text responses are the common case; only parse what can be JSON
+        if output.lstrip()[:1] not in ("{", "["):
+            return output
+        try:
+            data = _loads(output)
+        except ValueError:
+            return output
+
+    if isinstance(data, dict) and "content" in data:
+        content = data["content"]
+        if isinstance(content, list):
+            # A null or non-string text part carries nothing to extract
+            texts = [c["text"] for c in content
+                     if isinstance(c, dict) and c.get("type") == "text" and isinstance(c.get("text"), str)]
+            return texts[0] if len(texts) == 1 else "\n".join(texts)
+    if isinstance(data, dict) and "text" in data:
+        text = data["text"]
+        return text if isinstance(text, str) else ""
+
+    return output if isinstance(output, str) else _dumps(output)
+
+
+# Most decisions kept per agent
+MAX_DECISIONS = 20
+
+# Only this much of an agent's output is searched for decisions
+MAX_DECISION_TEXT = 256 * 1024
+
+# Key statements worth keeping outside of a decision section, matched in
+# one pass per line instead of one substring scan per phrase. Both patterns
+# ignore case, so lines never need a lowercased copy.
+_KEY_PHRASE_RE = re.compile("|".join(re.escape(phrase) for phrase in (
+    "we decided", "we chose", "final design:", "winning concept:",
+    "using:", "architecture:", "stack:", "the approach is",
+)), re.IGNORECASE)
+
+# Headers that indicate important content (from our templates)
+_DECISION_HEADER_RE = re.compile("|".join(re.escape(header) for header in (
+    "### decision", "### core principle", "### specification",
+    "### visual specification", "### interaction specification",
+    "### motion specification", "### responsive behavior",
+    "### problem definition", "### key finding", "### recommendation",
+    "### why this", "### trade-off", "### quality benchmark",
+    "### architecture decision", "### code pattern", "### implementation",
+)), re.IGNORECASE)
+
+
+# Noise to skip, matched in one pass per line
+_NOISE_RE = re.compile("|".join(re.escape(noise) for noise in (
+    "│", "├", "└", "─", "┌", "┐", "┘", "┴", "┬", "┤", "┼",  # Table borders
+    "---", "===", "***",  # Horizontal rules
+    "```",  # Code blocks markers
+    "| --- |", "| :-- |",  # Markdown table separators
+)))
+
+
+def extract_decisions(output: str | dict) -> list[str]:
     """Extract structured decisions from agent output.
 
     Looks for our phase output templates (### headers) and extracts
     the key decisions, specifications, and rationale.
     """
-    text = extract_actual_content(output)
+    text = extract_actual_content(output)[:MAX_DECISION_TEXT]
     if not text:
         return []
 
-    decisions = []
-    lines = text.split('\n')
-
-    # Headers that indicate important content (from our templates)
-    decision_headers = [
-        "### decision", "### core principle", "### specification",
-        "### visual specification", "### interaction specification",
-        "### motion specification", "### responsive behavior",
-        "### problem definition", "### key finding", "### recommendation",
-        "### why this", "### trade-off", "### quality benchmark",
-        "### architecture decision", "### code pattern", "### implementation"
-    ]
-
-    # Noise patterns to skip
-    noise_patterns = [
-        "│", "├", "└", "─", "┌", "┐", "┘", "┴", "┬", "┤", "┼",  # Table borders
-        "---", "===", "***",  # Horizontal rules
-        "```",  # Code blocks markers
-        "| --- |", "| :-- |",  # Markdown table separators
-    ]
+    # Without a ### header or a key phrase anywhere, no line can match
+    if "###" not in text and not _KEY_PHRASE_RE.search(text):
+        return []
 
+    decisions = []
     current_section = None
     section_content = []
 
-    for i, line in enumerate(lines):
+    for line in text.split('\n'):
+        # Only the first MAX_DECISIONS are kept; stop scanning once we have them
+        if len(decisions) >= MAX_DECISIONS:
+            break
+
         line_stripped = line.strip()
-        line_lower = line_stripped.lower()
 
-        # Skip noise
-        if any(noise in line_stripped for noise in noise_patterns):
-            continue
+        # Cheapest rejections first; the noise regex only sees surviving lines
 
         # Skip empty lines and very short lines
         if len(line_stripped) < 5:
@@ -519,11 +969,14 @@ def extract_decisions(output: str) -> list[str]:
         if line_stripped.startswith('|') and line_stripped.endswith('|'):
             continue
 
+        # Skip noise
+        if _NOISE_RE.search(line_stripped):
+            continue
+
         # Check if this is a decision header
         is_header = line_stripped.startswith('###')
-        is_decision_header = any(h in line_lower for h in decision_headers)
 
-        if is_header and is_decision_header:
+        if is_header and _DECISION_HEADER_RE.search(line_stripped):
             # Save previous section if it had content
             if current_section and section_content:
                 content = ' '.join(section_content[:3])  # First 3 lines
@@ -539,11 +992,7 @@ def extract_decisions(output: str) -> list[str]:
                 section_content.append(line_stripped)
         else:
             # Look for key statements outside sections
-            key_phrases = [
-                "we decided", "we chose", "final design:", "winning concept:",
-                "using:", "architecture:", "stack:", "the approach is"
-            ]
-            if any(phrase in line_lower for phrase in key_phrases):
+            if _KEY_PHRASE_RE.search(line_stripped):
                 if 20 < len(line_stripped) < 250:
                     decisions.append(line_stripped)
 
@@ -553,16 +1002,146 @@ def extract_decisions(output: str) -> list[str]:
         if len(content) > 20:
             decisions.append(f"**{current_section}**: {content[:200]}")
 
-    return decisions[:20]
+    return decisions[:MAX_DECISIONS]
+
+
+# ============================================================================
+# BANNERS
+# ============================================================================
+
+# Static banner text is built once; handlers fill in the named fields with
+# %-formatting. Each template carries its own trailing newline.
+_TPL_SEQ_FIRST = f"""
+🚀 CHITTER: Agent #1 Starting
+{_BAR}
+Agent: %(agent)s
+Position: #1 (first in sequence)
+Reading context from: (none - you're first!)
+
+Task: %(task)s
+{_BAR}
+
+"""
+
+_TPL_SEQ_START = f"""
+🚀 CHITTER: Agent #%(number)s Starting
+{_BAR}
+Agent: %(agent)s
+Position: #%(number)s
+Reading context from: %(reading_from)s
+
+Task: %(task)s
+{_BAR}
+
+"""
+
+_TPL_SEQ_BLOCKED = f"""
+🛑 CHITTER: Sequential Mode - Agent Queued
+{_BAR}
+Agent: %(agent)s
+Queue Position: #%(number)s
+Waiting for: %(waiting_for)s to complete
+
+╔════════════════════════════════════════════════════════════════════╗
+║  MAIN CLAUDE: Spawn agents ONE AT A TIME for telephone game.      ║
+║                                                                    ║
+║  1. Wait for %(wait_for)-20s to complete           ║
+║  2. Then spawn this agent again (same parameters)                  ║
+║                                                                    ║
+║  Or spawn all agents sequentially from the start.                  ║
+╚════════════════════════════════════════════════════════════════════╝
+
+{_BAR}
+
+"""
+
+_TPL_QUEUE_FIRST = f"""
+✅ CHITTER: First agent running
+{_BAR}
+Agent: %(agent)s
+Position: #1 (first)
+
+📄 Coordination file: %(coord_file)s
+{_BAR}
+
+"""
+
+_TPL_QUEUE_READY = f"""
+✅ CHITTER: Running (predecessors complete)
+{_BAR}
+Agent: %(agent)s
+Position: #%(number)s
+Completed before you: %(completed)s agents
+
+📄 Read previous decisions: %(coord_file)s
+{_BAR}
+
+"""
+
+_TPL_QUEUE_PARALLEL = f"""
+⚠️  CHITTER: Parallel execution detected
+{_BAR}
+Agent: %(agent)s
+Position: #%(number)s
+Still running ahead of you: %(ahead)s
+
+⚠️  For true "telephone game", spawn agents ONE AT A TIME.
+   This agent may miss decisions from agents still running.
+
+📄 Coordination file (may be incomplete): %(coord_file)s
+{_BAR}
+
+"""
+
+_TPL_BLOCK_REQUIRED = f"""
+🚫 CHITTER: BLOCKED - Coordination Required
+{_BAR}
+
+Add CHITTER_COORDINATION to your prompt and read: %(coord_file)s
+
+{_BAR}
+
+"""
+
+_TPL_COMPLETE = f"""
+✅ CHITTER: Agent #%(number)s Complete
+{_BAR}
+Agent: %(agent)s
+Built on: %(built_on)s
+
+Key decisions/learnings:
+%(decisions)s
+{_BAR}
+
+"""
+
+_TPL_ALL_COMPLETE = f"""
+🎉 CHITTER: Telephone Game Complete!
+{_BAR}
+Agents completed in sequence:
+
+%(summary)s
+
+Each agent built on the previous one's work.
+{_BAR}
+
+"""
 
 
 # ============================================================================
 # HOOK HANDLERS
 # ============================================================================
 
-def handle_pre(tool_input: dict, tool_use_id: str = "", session_id: str = "unknown") -> bool:
+def handle_pre(tool_input: dict, tool_use_id: str = "", session_id: str = "unknown", config: dict = None) -> bool:
     """Handle PreToolUse for Task tool. Returns False to block, True to allow."""
-    config = get_config()
+    # Without a session id (unparseable input, or none sent) every such hook
+    # would share one "unknown" queue and workflow; allow the agent untracked
+    if session_id == "unknown":
+        log("PRE: no session id - allowing untracked")
+        return True
+
+    if config is None:
+        config = get_config()
     mode = config.get("mode", "queue")
     max_concurrent = config.get("max_concurrent", 1)
 
@@ -570,96 +1149,82 @@ def handle_pre(tool_input: dict, tool_use_id: str = "", session_id: str = "unkno
     subagent_type = tool_input.get("subagent_type", "unknown")
     description = tool_input.get("description", "")
 
-    agent_id = tool_use_id[:12] if tool_use_id else f"{subagent_type}-{str(__import__('uuid').uuid4())[:4]}"
+    # TRACK MODE: log only, no queue or workflow bookkeeping
+    if mode == "track":
+        log(f"[{session_id}] TRACK: {subagent_type} {description}")
+        return True
+
+    agent_id = tool_use_id[:12] if tool_use_id else f"{subagent_type}-{os.urandom(2).hex()}"
     task_summary = description if description else prompt[:100]
 
     # Get or create workflow
-    workflow = get_active_workflow(session_id)
-    if not workflow:
-        workflow = create_workflow(f"Queue workflow: {description}", session_id)
+    workflow = get_or_create_workflow(session_id, f"Queue workflow: {description}")
 
     # SEQUENTIAL MODE: Enforce one-at-a-time execution
     # Blocks parallel agents - Main Claude must spawn sequentially
     if mode == "sequential":
-        position = add_to_queue(session_id, agent_id, subagent_type, task_summary)
+        # Queue the agent and take (or wait for) its turn in one locked update
+        with QueueLock(session_id):
+            queue = get_queue(session_id, fresh=True)
+            position = _enqueue(session_id, queue, agent_id, subagent_type, task_summary)
+            my_turn = _is_turn(queue, agent_id, max_concurrent)
+            _set_status(queue, queue["agents"][position], "running" if my_turn else "blocked")
+            save_queue(session_id, queue)
         coord_file = get_coordination_file(session_id)
 
+        # Optionally hold the hook until the predecessor finishes instead of
+        # making Main Claude re-spawn
+        wait_seconds = config.get("block_wait_seconds", 0)
+        if not my_turn and wait_seconds:
+            log(f"[{session_id}] SEQ: {agent_id} WAITING up to {wait_seconds}s for its turn")
+            flush_log()  # Don't hold the log back while we sit here
+            my_turn = wait_for_turn(session_id, agent_id, max_concurrent, wait_seconds)
+            queue = get_queue(session_id)  # Other agents moved on meanwhile
+            if my_turn:
+                workflow = get_or_create_workflow(session_id, f"Queue workflow: {description}")
+
         # Check if it's our turn
-        if is_turn(session_id, agent_id, max_concurrent):
+        if my_turn:
             # It's our turn - run!
-            mark_agent_running(session_id, agent_id)
-            add_agent_to_workflow(workflow, agent_id, task_summary, subagent_type)
-            write_coordination_state(session_id, workflow, subagent_type, task_summary)
-
-            completed = get_completed_agents(session_id)
+            register_agent(workflow, session_id, agent_id, task_summary, subagent_type)
 
             if position == 0:
                 log(f"[{session_id}] START #1: {subagent_type} (first agent)")
-                print(f"""
-🚀 CHITTER: Agent #1 Starting
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Agent: {subagent_type}
-Position: #1 (first in sequence)
-Reading context from: (none - you're first!)
-
-Task: {task_summary}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+                sys.stdout.write(_TPL_SEQ_FIRST % {
+                    "agent": subagent_type, "task": task_summary,
+                })
             else:
                 # Get names of completed agents
-                completed_names = [a["type"] for a in completed]
+                completed_names = [a["type"] for a in queue["agents"] if a["status"] == "complete"]
                 log(f"[{session_id}] START #{position + 1}: {subagent_type} (reading from: {', '.join(completed_names)})")
-                print(f"""
-🚀 CHITTER: Agent #{position + 1} Starting
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Agent: {subagent_type}
-Position: #{position + 1}
-Reading context from: {', '.join(completed_names)}
-
-Task: {task_summary}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+                sys.stdout.write(_TPL_SEQ_START % {
+                    "agent": subagent_type, "number": position + 1,
+                    "reading_from": ', '.join(completed_names), "task": task_summary,
+                })
             return True
 
         else:
             # Not our turn - BLOCK
-            agents_ahead = get_agents_ahead(session_id, agent_id)
+            agents_ahead = _unfinished_ahead(queue, position)
             first_ahead = agents_ahead[0] if agents_ahead else None
-            mark_agent_blocked(session_id, agent_id)
 
             log(f"[{session_id}] SEQ: {agent_id} BLOCKED - waiting for {len(agents_ahead)} agents")
 
-            print(f"""
-🛑 CHITTER: Sequential Mode - Agent Queued
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Agent: {subagent_type}
-Queue Position: #{position + 1}
-Waiting for: {first_ahead['type'] if first_ahead else 'unknown'} to complete
-
-╔════════════════════════════════════════════════════════════════════╗
-║  MAIN CLAUDE: Spawn agents ONE AT A TIME for telephone game.      ║
-║                                                                    ║
-║  1. Wait for {first_ahead['type'] if first_ahead else 'the current agent':20} to complete           ║
-║  2. Then spawn this agent again (same parameters)                  ║
-║                                                                    ║
-║  Or spawn all agents sequentially from the start.                  ║
-╚════════════════════════════════════════════════════════════════════╝
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+            sys.stdout.write(_TPL_SEQ_BLOCKED % {
+                "agent": subagent_type, "number": position + 1,
+                "waiting_for": first_ahead['type'] if first_ahead else 'unknown',
+                "wait_for": first_ahead['type'] if first_ahead else 'the current agent',
+            })
             sys.exit(1)
 
     # QUEUE MODE: Sequential execution with telephone game pattern
     # NOTE: This mode tracks order but does NOT block. Main Claude should spawn
     # agents sequentially (one at a time) for true telephone-game pattern.
     elif mode == "queue":
-        # Add to queue (or get existing position if retry)
-        position = add_to_queue(session_id, agent_id, subagent_type, task_summary)
-        mark_agent_running(session_id, agent_id)
-        add_agent_to_workflow(workflow, agent_id, task_summary, subagent_type)
-
-        # Write coordination file with previous agents' decisions
-        write_coordination_state(session_id, workflow, subagent_type, task_summary)
+        # Add to queue and start running (or get existing position if retry)
+        position = add_to_queue(session_id, agent_id, subagent_type, task_summary, status="running")
+        # Register and write coordination file with previous agents' decisions
+        register_agent(workflow, session_id, agent_id, task_summary, subagent_type)
         coord_file = get_coordination_file(session_id)
 
         completed = get_completed_agents(session_id)
@@ -667,126 +1232,122 @@ Waiting for: {first_ahead['type'] if first_ahead else 'unknown'} to complete
 
         if position == 0:
             log(f"[{session_id}] QUEUE: {agent_id} is FIRST - running")
-            print(f"""
-✅ CHITTER: First agent running
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Agent: {subagent_type}
-Position: #1 (first)
-
-📄 Coordination file: {coord_file}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+            sys.stdout.write(_TPL_QUEUE_FIRST % {
+                "agent": subagent_type, "coord_file": coord_file,
+            })
         elif len(agents_ahead) == 0:
             log(f"[{session_id}] QUEUE: {agent_id} position {position} - running (predecessors complete)")
-            print(f"""
-✅ CHITTER: Running (predecessors complete)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Agent: {subagent_type}
-Position: #{position + 1}
-Completed before you: {len(completed)} agents
-
-📄 Read previous decisions: {coord_file}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+            sys.stdout.write(_TPL_QUEUE_READY % {
+                "agent": subagent_type, "number": position + 1,
+                "completed": len(completed), "coord_file": coord_file,
+            })
         else:
             # Parallel detected - warn but don't block
             ahead_types = [a['type'] for a in agents_ahead]
             log(f"[{session_id}] QUEUE: {agent_id} position {position} - PARALLEL with {len(agents_ahead)} others")
-            print(f"""
-⚠️  CHITTER: Parallel execution detected
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Agent: {subagent_type}
-Position: #{position + 1}
-Still running ahead of you: {', '.join(ahead_types)}
-
-⚠️  For true "telephone game", spawn agents ONE AT A TIME.
-   This agent may miss decisions from agents still running.
-
-📄 Coordination file (may be incomplete): {coord_file}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+            sys.stdout.write(_TPL_QUEUE_PARALLEL % {
+                "agent": subagent_type, "number": position + 1,
+                "ahead": ', '.join(ahead_types), "coord_file": coord_file,
+            })
         return True
 
     # BLOCK MODE: Original blocking behavior (require coordination marker)
     elif mode == "block":
         # Check if parallel
-        active_agents = [a for a in workflow.get("agents", {}).values() if a.get("status") == "working"]
+        has_active = any(a.get("status") == "working" for a in workflow.get("agents", {}).values())
 
-        if active_agents:
+        if has_active:
             if not prompt_has_coordination(prompt):
                 log(f"[{session_id}] BLOCKED: {agent_id} - no coordination instruction")
                 coord_file = get_coordination_file(session_id)
-                print(f"""
-🚫 CHITTER: BLOCKED - Coordination Required
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Add CHITTER_COORDINATION to your prompt and read: {coord_file}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+                sys.stdout.write(_TPL_BLOCK_REQUIRED % {"coord_file": coord_file})
                 sys.exit(1)
 
-        add_agent_to_workflow(workflow, agent_id, task_summary, subagent_type)
-        write_coordination_state(session_id, workflow, subagent_type, task_summary)
+        register_agent(workflow, session_id, agent_id, task_summary, subagent_type)
 
-    # NUDGE/TRACK MODE: Just track, don't block
+    # NUDGE MODE: Just track, don't block
     else:
-        add_agent_to_workflow(workflow, agent_id, task_summary, subagent_type)
-        write_coordination_state(session_id, workflow, subagent_type, task_summary)
+        register_agent(workflow, session_id, agent_id, task_summary, subagent_type)
         log(f"[{session_id}] TRACKING: {agent_id} ({subagent_type})")
 
     return True
 
 
-def handle_post(tool_input: dict, tool_output, tool_use_id: str = "", session_id: str = "unknown") -> None:
-    """Handle PostToolUse for Task tool."""
-    subagent_type = tool_input.get("subagent_type", "unknown")
-    agent_id = tool_use_id[:12] if tool_use_id else None
-
-    # Get position before marking complete
-    queue = get_queue(session_id)
-    position = None
-    for a in queue.get("agents", []):
-        if a["id"] == agent_id:
-            position = a["position"]
-            break
-
-    # Mark complete in queue - but only if it was actually running
-    if agent_id:
-        was_running = mark_agent_complete(session_id, agent_id)
-        if not was_running:
-            # This agent was blocked in PRE, POST fired anyway - skip processing
-            return
+def _complete_in_workflow(session_id: str, agent_id: str | None, subagent_type: str, tool_output) -> list | None:
+    """Complete the agent in the workflow and rewrite the coordination file.
 
-    # Update workflow
+    Returns the agent's decisions, or None if the session has no active workflow.
+    """
     workflow = get_active_workflow(session_id)
     if not workflow:
-        return
+        return None
 
     if agent_id not in workflow.get("agents", {}):
-        for aid, agent in workflow.get("agents", {}).items():
-            if agent.get("status") == "working" and agent.get("subagent_type") == subagent_type:
-                agent_id = aid
-                break
+        agent_id = find_working_agent(workflow, subagent_type)
 
     decisions = []
     if agent_id and agent_id in workflow.get("agents", {}):
-        complete_agent(workflow, agent_id, tool_output)
-
-        # Get the decisions that were extracted
-        workflow = get_active_workflow(session_id)
-        if workflow and agent_id in workflow.get("agents", {}):
+        # Decisions come back on the workflow as written; no re-read needed
+        workflow = complete_agent(workflow, agent_id, tool_output)
+        if workflow:
             decisions = workflow["agents"][agent_id].get("decisions", [])
 
-        # Update coordination file for next agent
-        if workflow:
+            # Update coordination file for next agent
             write_coordination_state(session_id, workflow, "next_agent", "pending")
+    return decisions
+
 
-    # Get previous agents for context
+def handle_post(tool_input: dict, tool_output, tool_use_id: str = "", session_id: str = "unknown", config: dict = None) -> None:
+    """Handle PostToolUse for Task tool."""
+    # Nothing was tracked in PRE for a hook without a session id
+    if session_id == "unknown":
+        log("POST: no session id - nothing to complete")
+        return
+
+    subagent_type = tool_input.get("subagent_type", "unknown")
+    agent_id = tool_use_id[:12] if tool_use_id else None
+
+    if config is None:
+        config = get_config()
+
+    if config.get("mode", "queue") == "track":
+        log(f"[{session_id}] TRACK COMPLETE: {subagent_type}")
+        return
+
+    # Get position before marking complete; read from disk, since the
+    # workflow is published on the strength of this check
+    queue = get_queue(session_id, fresh=True)
+    position = _find_position(queue, agent_id)
+
+    # Only complete an agent that was actually running
+    if agent_id and position is not None:
+        status = queue["agents"][position]["status"]
+        if status != "running":
+            # This agent was blocked in PRE, POST fired anyway - skip processing
+            log(f"[{session_id}] QUEUE: {agent_id} POST fired but status was '{status}' - not marking complete")
+            return
+
+    # Publish decisions and the coordination file first: marking the queue
+    # complete is what releases a successor waiting in PRE, and it must find
+    # this agent's decisions already there. The queue is marked complete even
+    # if that fails, or the agent stays running and blocks the session
+    try:
+        decisions = _complete_in_workflow(session_id, agent_id, subagent_type, tool_output)
+    finally:
+        released = not agent_id or mark_agent_complete(session_id, agent_id)
+    if not released:
+        return
+    if decisions is None:
+        return  # No active workflow
+
+    # Get previous agents for context, counting unfinished ones on the same pass
     completed_before = []
+    incomplete = 0
     queue = get_queue(session_id)
     for a in queue.get("agents", []):
-        if position is not None and a["position"] < position and a["status"] == "complete":
+        if a["status"] != "complete":
+            incomplete += 1
+        elif position is not None and a["position"] < position:
             completed_before.append(a["type"])
 
     # Log completion with decisions
@@ -794,10 +1355,9 @@ def handle_post(tool_input: dict, tool_output, tool_use_id: str = "", session_id
 
     # Build the completion message
     decision_lines = []
-    for d in decisions[:5]:  # Show top 5 decisions
+    for d in itertools.islice(decisions, 5):  # Show top 5 decisions
         # Truncate long decisions
-        d_display = d[:100] + "..." if len(d) > 100 else d
-        decision_lines.append(f"   • {d_display}")
+        decision_lines.append(f"   • {d[:100]}{'...' if len(d) > 100 else ''}")
 
     if decisions:
         log(f"[{session_id}] COMPLETE #{pos_display}: {subagent_type}")
@@ -805,42 +1365,24 @@ def handle_post(tool_input: dict, tool_output, tool_use_id: str = "", session_id
             log(f"[{session_id}]   → {d[:80]}")
 
     # Print visible completion
-    print(f"""
-✅ CHITTER: Agent #{pos_display} Complete
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Agent: {subagent_type}
-Built on: {', '.join(completed_before) if completed_before else '(first agent)'}
-
-Key decisions/learnings:""")
-
-    if decision_lines:
-        print("\n".join(decision_lines))
-    else:
-        print("   (no structured decisions extracted)")
-
-    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+    sys.stdout.write(_TPL_COMPLETE % {
+        "agent": subagent_type, "number": pos_display,
+        "built_on": ', '.join(completed_before) if completed_before else '(first agent)',
+        "decisions": "\n".join(decision_lines) if decision_lines else "   (no structured decisions extracted)",
+    })
 
     # Check if all done
-    all_complete = all(a["status"] == "complete" for a in queue["agents"]) if queue["agents"] else False
+    all_complete = incomplete == 0 and bool(queue["agents"])
 
     if all_complete and len(queue["agents"]) > 1:
         log(f"[{session_id}] QUEUE COMPLETE: All {len(queue['agents'])} agents finished")
 
         # Build summary of all agents
         summary_lines = []
-        for a in sorted(queue["agents"], key=lambda x: x["position"]):
+        for a in queue["agents"]:
             summary_lines.append(f"   #{a['position'] + 1}. {a['type']}")
 
-        print(f"""
-🎉 CHITTER: Telephone Game Complete!
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Agents completed in sequence:
-""")
-        print("\n".join(summary_lines))
-        print(f"""
-Each agent built on the previous one's work.
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-""")
+        sys.stdout.write(_TPL_ALL_COMPLETE % {"summary": "\n".join(summary_lines)})
 
 
 def main():
@@ -849,11 +1391,11 @@ def main():
         sys.exit(1)
 
     command = sys.argv[1]
+    config = get_config()  # Loaded once and passed to the handlers
 
     if command == "pre":
-        raw_input = sys.stdin.read()
         try:
-            data = json.loads(raw_input)
+            data = _loads(sys.stdin.buffer.read())
             tool_input = data.get("tool_input", {})
             tool_use_id = data.get("tool_use_id", "")
             session_id = data.get("session_id", "unknown")[:8]
@@ -867,12 +1409,11 @@ def main():
             tool_input = {}
             tool_use_id = ""
             session_id = "unknown"
-        handle_pre(tool_input, tool_use_id, session_id)
+        handle_pre(tool_input, tool_use_id, session_id, config)
 
     elif command == "post":
-        raw_input = sys.stdin.read()
         try:
-            data = json.loads(raw_input)
+            data = _loads(sys.stdin.buffer.read())
             tool_input = data.get("tool_input", {})
             tool_response = data.get("tool_response", "")
             tool_use_id = data.get("tool_use_id", "")
@@ -881,16 +1422,12 @@ def main():
             prompt = tool_input.get("prompt", "")
             project, file_path = extract_project_from_prompt(prompt)
 
-            if isinstance(tool_response, dict):
-                tool_response_str = json.dumps(tool_response)
-            else:
-                tool_response_str = str(tool_response) if tool_response else ""
-
             agent_type = tool_input.get('subagent_type', 'unknown')
             desc = tool_input.get('description', '')
             log(f"[{session_id}] POST: {agent_type} ({desc}) project={project}")
 
-            handle_post(tool_input, tool_response_str, tool_use_id, session_id)
+            # Passed through as parsed; complete_agent reads dict responses directly
+            handle_post(tool_input, tool_response, tool_use_id, session_id, config)
         except Exception as e:
             log(f"POST PARSE ERROR: {e}")
             import traceback
@@ -17,13 +17,34 @@ Real-time coordination for Claude Code agents
 - chitter_status: Check active workflows before starting new ones
 """
 
+import asyncio
+import atexit
 import json
 import os
-import uuid
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any
 
+# orjson is optional; the stdlib json module does the same job more slowly.
+# Its decode errors subclass json.JSONDecodeError, so handlers catch either.
+try:
+    import orjson
+
+    def _loads(data):
+        return orjson.loads(data)
+
+    def _dumpb(obj) -> bytes:
+        return orjson.dumps(obj, default=str)
+except ImportError:
+    def _loads(data):
+        return json.loads(data)
+
+    def _dumpb(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), default=str).encode()
+
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
@@ -33,15 +54,27 @@ CHITTER_DIR = Path.home() / ".chitter"
 WORKFLOWS_DIR = CHITTER_DIR / "workflows"
 LOG_FILE = CHITTER_DIR / "chitter.log"
 
+# Workflow files are compact JSON; CHITTER_PRETTY=1 indents them for debugging
+PRETTY_STATE = os.environ.get("CHITTER_PRETTY") == "1"
+
 # Ensure directories exist
 WORKFLOWS_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def log(message: str) -> None:
-    """Append timestamped message to log file."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    with open(LOG_FILE, "a") as f:
-        f.write(f"[{timestamp}] {message}\n")
+# Log file descriptor, opened on the first log() call and kept for the life
+# of the server. Each line is one os.write on the O_APPEND descriptor, so
+# lines from the server and concurrent hooks never interleave.
+_LOG_FD = -1
+
+
+def log(message: str, now: datetime | None = None) -> None:
+    """Append timestamped message to log file, stamped with now if given."""
+    global _LOG_FD
+    if _LOG_FD < 0:
+        _LOG_FD = os.open(LOG_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        atexit.register(os.close, _LOG_FD)
+    timestamp = (now or datetime.now()).strftime("%H:%M:%S")
+    os.write(_LOG_FD, f"[{timestamp}] {message}\n".encode())
 
 server = Server("chitter")
 
@@ -51,45 +84,114 @@ def get_workflow_path(workflow_id: str) -> Path:
     return WORKFLOWS_DIR / f"{workflow_id}.json"
 
 
+# path -> (file identity, workflow) for the last parse of each workflow file.
+# The server is long-lived and most tool calls re-read the same files.
+_workflow_cache: dict[str, tuple[tuple, dict]] = {}
+
+
+def _file_identity(path: Path | str) -> tuple:
+    """Something that changes whenever the file is replaced or rewritten."""
+    st = os.stat(path)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def read_workflow_file(path: Path | str) -> dict:
+    """Parse a workflow file, reusing the last parse while the file is unchanged.
+
+    The hook writes these files too, so every call checks the file's identity.
+    The dict is shared with the cache: callers that change it must save it.
+    """
+    key = str(path)
+    identity = _file_identity(path)
+    cached = _workflow_cache.get(key)
+    if cached and cached[0] == identity:
+        return cached[1]
+    with open(path, "rb") as f:
+        workflow = _loads(f.read())
+    _workflow_cache[key] = (identity, workflow)
+    return workflow
+
+
+# workflow_id -> (file identity, conflict count) from the last review. Close
+# reuses the count while the file is still exactly as the review left it.
+_review_conflicts: dict[str, tuple[tuple, int]] = {}
+
+
 def load_workflow(workflow_id: str) -> dict | None:
     """Load workflow state from disk."""
-    path = get_workflow_path(workflow_id)
-    if path.exists():
-        return json.loads(path.read_text())
-    return None
+    try:
+        return read_workflow_file(get_workflow_path(workflow_id))
+    except FileNotFoundError:
+        return None
 
 
 def save_workflow(workflow: dict) -> None:
     """Save workflow state to disk (atomic write)."""
     path = get_workflow_path(workflow["workflow_id"])
     temp_path = path.with_suffix(".tmp")
-    temp_path.write_text(json.dumps(workflow, indent=2, default=str))
-    temp_path.rename(path)
+    if PRETTY_STATE:
+        data = json.dumps(workflow, indent=2, default=str).encode()
+    else:
+        data = _dumpb(workflow)
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)  # Atomic overwrite on every platform
+    _workflow_cache[str(path)] = (_file_identity(path), workflow)
+
+
+def _remove_workflow_file(path: Path) -> None:
+    """Delete a workflow file along with the hook's <id>.lock beside it."""
+    _workflow_cache.pop(str(path), None)
+    path.unlink(missing_ok=True)
+    path.with_suffix(".lock").unlink(missing_ok=True)
 
 
 def delete_workflow(workflow_id: str) -> None:
     """Delete workflow state file."""
-    path = get_workflow_path(workflow_id)
-    if path.exists():
-        path.unlink()
+    _remove_workflow_file(get_workflow_path(workflow_id))
+
+
+# Cleanup runs at most once per interval rather than on every tool call
+CLEANUP_INTERVAL = 300.0  # seconds
+_last_cleanup = None
 
 
 def cleanup_old_workflows(max_age_hours: int = 24) -> int:
-    """Remove workflows older than max_age_hours. Returns count deleted."""
+    """Remove workflows older than max_age_hours. Returns count deleted.
+
+    A file modified since the cutoff can't be stale, so only files whose
+    mtime is older are parsed to check created_at. Hook lock files older
+    than the cutoff whose workflow is gone are removed too.
+    """
     deleted = 0
     cutoff = datetime.now() - timedelta(hours=max_age_hours)
-
-    for path in WORKFLOWS_DIR.glob("*.json"):
-        try:
-            workflow = json.loads(path.read_text())
-            created = datetime.fromisoformat(workflow.get("created_at", "2000-01-01"))
-            if created < cutoff:
-                path.unlink()
+    cutoff_ts = cutoff.timestamp()
+
+    with os.scandir(WORKFLOWS_DIR) as entries:
+        for entry in entries:
+            is_lock = entry.name.endswith(".lock")
+            if not (is_lock or entry.name.endswith(".json")) or not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                if entry.stat().st_mtime >= cutoff_ts:
+                    continue
+            except OSError:
+                continue  # Removed since the directory was listed
+            path = Path(entry.path)
+            if is_lock:
+                # Left behind by a workflow deleted before locks were cleaned up
+                if not path.with_suffix(".json").exists():
+                    path.unlink(missing_ok=True)
+                continue
+            try:
+                workflow = read_workflow_file(path)
+                created = datetime.fromisoformat(workflow.get("created_at", "2000-01-01"))
+                if created < cutoff:
+                    _remove_workflow_file(path)
+                    deleted += 1
+            except (json.JSONDecodeError, ValueError):
+                # Corrupted file, delete it
+                _remove_workflow_file(path)
                 deleted += 1
-        except (json.JSONDecodeError, ValueError):
-            # Corrupted file, delete it
-            path.unlink()
-            deleted += 1
 
     return deleted
 
@@ -99,16 +201,16 @@ def detect_conflicts(workflow: dict) -> list[dict]:
     conflicts = []
     agents = workflow.get("agents", {})
 
-    # Check for file conflicts
-    files_by_agent = {}
+    # Check for file conflicts. Dicts serve as insertion-ordered sets, so an
+    # agent listing a file twice still counts once.
+    files_by_agent = defaultdict(dict)  # file -> {agent_id: None}
     for agent_id, agent in agents.items():
         for f in agent.get("files_modified", []):
-            if f not in files_by_agent:
-                files_by_agent[f] = []
-            files_by_agent[f].append(agent_id)
+            files_by_agent[f][agent_id] = None
 
-    for file, agent_ids in files_by_agent.items():
-        if len(agent_ids) > 1:
+    for file, file_agents in files_by_agent.items():
+        if len(file_agents) > 1:
+            agent_ids = list(file_agents)
             conflicts.append({
                 "type": "file_conflict",
                 "severity": "high",
@@ -118,49 +220,29 @@ def detect_conflicts(workflow: dict) -> list[dict]:
             })
 
     # Check for area overlap with different decisions
-    areas_decisions = {}  # area -> [(agent_id, decision)]
+    areas_decisions = defaultdict(lambda: ([], {}))  # area -> ([decision], {agent_id: None})
     for agent_id, agent in agents.items():
-        areas = agent.get("areas_of_concern", [])
         decisions = agent.get("decisions", [])
-
-        for area in areas:
-            if area not in areas_decisions:
-                areas_decisions[area] = []
-            for decision in decisions:
-                areas_decisions[area].append((agent_id, decision))
-
-    for area, entries in areas_decisions.items():
-        if len(entries) > 1:
-            # Multiple agents made decisions in same area
-            agent_ids = list(set(e[0] for e in entries))
-            if len(agent_ids) > 1:
-                conflicts.append({
-                    "type": "area_overlap",
-                    "severity": "medium",
-                    "area": area,
-                    "agents": agent_ids,
-                    "decisions": [e[1] for e in entries],
-                    "message": f"Multiple agents made decisions in '{area}': {', '.join(agent_ids)} - review for compatibility"
-                })
-
-    # Check for interface mismatches (expects vs created)
-    interfaces_expected = {}  # interface_name -> [(agent_id, spec)]
-    interfaces_created = {}
-
-    for agent_id, agent in agents.items():
-        for decision in agent.get("decisions", []):
-            if decision.get("type") == "interface":
-                desc = decision.get("decision", "").lower()
-                if "expects" in desc or "expect" in desc:
-                    key = decision.get("decision", "")[:50]
-                    if key not in interfaces_expected:
-                        interfaces_expected[key] = []
-                    interfaces_expected[key].append((agent_id, decision))
-                elif "created" in desc or "create" in desc or "provides" in desc:
-                    key = decision.get("decision", "")[:50]
-                    if key not in interfaces_created:
-                        interfaces_created[key] = []
-                    interfaces_created[key].append((agent_id, decision))
+        if not decisions:
+            continue
+
+        for area in agent.get("areas_of_concern", []):
+            area_decisions, area_agents = areas_decisions[area]
+            area_decisions.extend(decisions)
+            area_agents[agent_id] = None
+
+    for area, (area_decisions, area_agents) in areas_decisions.items():
+        # Multiple agents made decisions in same area
+        if len(area_agents) > 1:
+            agent_ids = list(area_agents)
+            conflicts.append({
+                "type": "area_overlap",
+                "severity": "medium",
+                "area": area,
+                "agents": agent_ids,
+                "decisions": area_decisions,
+                "message": f"Multiple agents made decisions in '{area}': {', '.join(agent_ids)} - review for compatibility"
+            })
 
     return conflicts
 
@@ -168,193 +250,232 @@ def detect_conflicts(workflow: dict) -> list[dict]:
 def get_active_workflows() -> list[dict]:
     """Get all active workflows."""
     workflows = []
-    for path in WORKFLOWS_DIR.glob("*.json"):
-        try:
-            workflow = json.loads(path.read_text())
-            if workflow.get("status") == "active":
-                workflows.append(workflow)
-        except json.JSONDecodeError:
-            pass
+    with os.scandir(WORKFLOWS_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                workflow = read_workflow_file(entry.path)
+                if workflow.get("status") == "active":
+                    workflows.append(workflow)
+            except (json.JSONDecodeError, OSError):
+                # Unreadable, or removed since the directory was listed
+                pass
     return workflows
 
 
-# Tool definitions
-@server.list_tools()
-async def list_tools() -> list[Tool]:
-    return [
-        Tool(
-            name="chitter_workflow_start",
-            description="Start a new coordination workflow before spawning parallel agents. Returns workflow_id and context to inject into agent prompts.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "description": {
-                        "type": "string",
-                        "description": "Overall goal of this parallel work (e.g., 'Building user authentication system')"
-                    },
-                    "agents_planned": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of agent roles/tasks planned (e.g., ['Frontend auth UI', 'Backend auth API', 'Database schema'])"
-                    }
+# Tool definitions, built once; list_tools hands out the same list
+TOOLS = [
+    Tool(
+        name="chitter_workflow_start",
+        description="Start a new coordination workflow before spawning parallel agents. Returns workflow_id and context to inject into agent prompts.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "description": {
+                    "type": "string",
+                    "description": "Overall goal of this parallel work (e.g., 'Building user authentication system')"
                 },
-                "required": ["description", "agents_planned"]
-            }
-        ),
-        Tool(
-            name="chitter_workflow_review",
-            description="Review workflow state after all agents complete. Returns summary of all decisions, detected conflicts, and integration points.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "workflow_id": {
-                        "type": "string",
-                        "description": "The workflow ID to review"
-                    }
+                "agents_planned": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of agent roles/tasks planned (e.g., ['Frontend auth UI', 'Backend auth API', 'Database schema'])"
+                }
+            },
+            "required": ["description", "agents_planned"]
+        }
+    ),
+    Tool(
+        name="chitter_workflow_review",
+        description="Review workflow state after all agents complete. Returns summary of all decisions, detected conflicts, and integration points.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "workflow_id": {
+                    "type": "string",
+                    "description": "The workflow ID to review"
+                }
+            },
+            "required": ["workflow_id"]
+        }
+    ),
+    Tool(
+        name="chitter_workflow_close",
+        description="Close a workflow after review and conflict resolution. Clears ephemeral state.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "workflow_id": {
+                    "type": "string",
+                    "description": "The workflow ID to close"
                 },
-                "required": ["workflow_id"]
-            }
-        ),
-        Tool(
-            name="chitter_workflow_close",
-            description="Close a workflow after review and conflict resolution. Clears ephemeral state.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "workflow_id": {
-                        "type": "string",
-                        "description": "The workflow ID to close"
-                    },
-                    "resolution_notes": {
-                        "type": "string",
-                        "description": "Optional notes on how conflicts were resolved"
-                    }
+                "resolution_notes": {
+                    "type": "string",
+                    "description": "Optional notes on how conflicts were resolved"
+                }
+            },
+            "required": ["workflow_id"]
+        }
+    ),
+    Tool(
+        name="chitter_agent_start",
+        description="Called by an agent when starting work. Declares task and areas of concern for conflict detection.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "workflow_id": {
+                    "type": "string",
+                    "description": "The workflow ID this agent belongs to"
                 },
-                "required": ["workflow_id"]
-            }
-        ),
-        Tool(
-            name="chitter_agent_start",
-            description="Called by an agent when starting work. Declares task and areas of concern for conflict detection.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "workflow_id": {
-                        "type": "string",
-                        "description": "The workflow ID this agent belongs to"
-                    },
-                    "agent_id": {
-                        "type": "string",
-                        "description": "Unique identifier for this agent (e.g., 'frontend-001')"
-                    },
-                    "task_summary": {
-                        "type": "string",
-                        "description": "Brief summary of what this agent will do"
-                    },
-                    "areas_of_concern": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Areas this agent will touch (e.g., ['auth flow', 'api endpoints', 'user model'])"
-                    }
+                "agent_id": {
+                    "type": "string",
+                    "description": "Unique identifier for this agent (e.g., 'frontend-001')"
                 },
-                "required": ["workflow_id", "agent_id", "task_summary", "areas_of_concern"]
-            }
-        ),
-        Tool(
-            name="chitter_decision",
-            description="Log a key decision. Call this for architecture, API, data model, dependency, or interface choices.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "workflow_id": {
-                        "type": "string",
-                        "description": "The workflow ID"
-                    },
-                    "agent_id": {
-                        "type": "string",
-                        "description": "The agent making this decision"
-                    },
-                    "decision_type": {
-                        "type": "string",
-                        "enum": ["architecture", "approach", "api", "data_model", "interface", "dependency", "other"],
-                        "description": "Category of decision"
-                    },
-                    "decision": {
-                        "type": "string",
-                        "description": "The decision made (e.g., 'Using REST with /api/auth/* endpoints')"
-                    },
-                    "rationale": {
-                        "type": "string",
-                        "description": "Why this decision was made"
-                    }
+                "task_summary": {
+                    "type": "string",
+                    "description": "Brief summary of what this agent will do"
                 },
-                "required": ["workflow_id", "agent_id", "decision_type", "decision"]
-            }
-        ),
-        Tool(
-            name="chitter_complete",
-            description="Mark agent task as complete. Include summary of work done and files modified.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "workflow_id": {
-                        "type": "string",
-                        "description": "The workflow ID"
-                    },
-                    "agent_id": {
-                        "type": "string",
-                        "description": "The agent completing"
-                    },
-                    "summary": {
-                        "type": "string",
-                        "description": "Summary of what was accomplished"
-                    },
-                    "files_modified": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of files created or modified"
-                    }
+                "areas_of_concern": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Areas this agent will touch (e.g., ['auth flow', 'api endpoints', 'user model'])"
+                }
+            },
+            "required": ["workflow_id", "agent_id", "task_summary", "areas_of_concern"]
+        }
+    ),
+    Tool(
+        name="chitter_decision",
+        description="Log a key decision. Call this for architecture, API, data model, dependency, or interface choices.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "workflow_id": {
+                    "type": "string",
+                    "description": "The workflow ID"
                 },
-                "required": ["workflow_id", "agent_id", "summary", "files_modified"]
-            }
-        ),
-        Tool(
-            name="chitter_status",
-            description="Check status of all active workflows. Call this before starting a new workflow to see if one is already in progress.",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-        )
-    ]
+                "agent_id": {
+                    "type": "string",
+                    "description": "The agent making this decision"
+                },
+                "decision_type": {
+                    "type": "string",
+                    "enum": ["architecture", "approach", "api", "data_model", "interface", "dependency", "other"],
+                    "description": "Category of decision"
+                },
+                "decision": {
+                    "type": "string",
+                    "description": "The decision made (e.g., 'Using REST with /api/auth/* endpoints')"
+                },
+                "rationale": {
+                    "type": "string",
+                    "description": "Why this decision was made"
+                }
+            },
+            "required": ["workflow_id", "agent_id", "decision_type", "decision"]
+        }
+    ),
+    Tool(
+        name="chitter_complete",
+        description="Mark agent task as complete. Include summary of work done and files modified.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "workflow_id": {
+                    "type": "string",
+                    "description": "The workflow ID"
+                },
+                "agent_id": {
+                    "type": "string",
+                    "description": "The agent completing"
+                },
+                "summary": {
+                    "type": "string",
+                    "description": "Summary of what was accomplished"
+                },
+                "files_modified": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of files created or modified"
+                }
+            },
+            "required": ["workflow_id", "agent_id", "summary", "files_modified"]
+        }
+    ),
+    Tool(
+        name="chitter_status",
+        description="Check status of all active workflows. Call this before starting a new workflow to see if one is already in progress.",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+            "required": []
+        }
+    )
+]
+
+
+@server.list_tools()
+async def list_tools() -> list[Tool]:
+    return TOOLS
+
+
+# Tool calls run on a worker thread so their disk I/O doesn't stall the
+# event loop. They still run one at a time: each handler is a load-modify-save
+# of a workflow file, and the parse cache is shared.
+_tool_lock = threading.Lock()
 
 
 @server.call_tool()
 async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+    return await asyncio.to_thread(_call_tool_serialized, name, arguments)
 
-    # Auto-cleanup old workflows on any call
-    cleanup_old_workflows()
-
-    if name == "chitter_workflow_start":
-        workflow_id = str(uuid.uuid4())[:8]
-        now = datetime.now().isoformat()
-        log(f"WORKFLOW START: {workflow_id} - {arguments['description']}")
-
-        workflow = {
-            "workflow_id": workflow_id,
-            "description": arguments["description"],
-            "agents_planned": arguments["agents_planned"],
-            "status": "active",
-            "agents": {},
-            "created_at": now,
-            "updated_at": now
-        }
 
-        save_workflow(workflow)
+def _call_tool_serialized(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+    with _tool_lock:
+        return handle_tool(name, arguments)
 
-        # Generate context for agent prompts
-        agent_context = f"""CHITTER COORDINATION PROTOCOL
+
+def handle_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
+
+    # Auto-cleanup old workflows, at most once per CLEANUP_INTERVAL
+    global _last_cleanup
+    now_mono = time.monotonic()
+    if _last_cleanup is None or now_mono - _last_cleanup > CLEANUP_INTERVAL:
+        cleanup_old_workflows()
+        _last_cleanup = now_mono
+
+    # One clock read per tool call; every timestamp it records shares it
+    now_dt = datetime.now()
+    now = now_dt.isoformat()
+
+    handler = HANDLERS.get(name)
+    if handler is None:
+        return [TextContent(type="text", text=f"Unknown tool: {name}")]
+    return handler(arguments, now, now_dt)
+
+
+def _handle_workflow_start(arguments: dict[str, Any], now: str, now_dt: datetime) -> list[TextContent]:
+    """Create a workflow and the protocol text to inject into agent prompts."""
+    # 8 hex chars, as before; redraw on the rare clash with an existing file
+    workflow_id = os.urandom(4).hex()
+    while get_workflow_path(workflow_id).exists():
+        workflow_id = os.urandom(4).hex()
+    log(f"WORKFLOW START: {workflow_id} - {arguments['description']}", now_dt)
+
+    workflow = {
+        "workflow_id": workflow_id,
+        "description": arguments["description"],
+        "agents_planned": arguments["agents_planned"],
+        "status": "active",
+        "agents": {},
+        "created_at": now,
+        "updated_at": now
+    }
+
+    save_workflow(workflow)
+
+    # Generate context for agent prompts
+    agent_context = f"""CHITTER COORDINATION PROTOCOL
 =============================
 Workflow ID: {workflow_id}
 Goal: {arguments['description']}
@@ -369,9 +490,9 @@ REQUIRED ACTIONS:
 
 This ensures your work integrates cleanly with other agents."""
 
-        return [TextContent(
-            type="text",
-            text=f"""Workflow created: {workflow_id}
+    return [TextContent(
+        type="text",
+        text=f"""Workflow created: {workflow_id}
 
 Inject this into each agent's task prompt:
 
@@ -380,90 +501,112 @@ Inject this into each agent's task prompt:
 ---
 
 After all agents complete, call chitter_workflow_review("{workflow_id}") to check for conflicts."""
-        )]
+    )]
+
 
-    elif name == "chitter_workflow_review":
-        workflow_id = arguments["workflow_id"]
-        log(f"WORKFLOW REVIEW: {workflow_id}")
-        workflow = load_workflow(workflow_id)
+def _handle_workflow_review(arguments: dict[str, Any], now: str, now_dt: datetime) -> list[TextContent]:
+    """Summarize a workflow's agents, decisions and files, and report conflicts."""
+    workflow_id = arguments["workflow_id"]
+    log(f"WORKFLOW REVIEW: {workflow_id}", now_dt)
+    workflow = load_workflow(workflow_id)
 
-        if not workflow:
-            return [TextContent(type="text", text=f"Workflow {workflow_id} not found")]
+    if not workflow:
+        return [TextContent(type="text", text=f"Workflow {workflow_id} not found")]
 
+    # Repeat reviews leave the file alone; it already says "reviewing"
+    if workflow.get("status") != "reviewing":
         workflow["status"] = "reviewing"
         save_workflow(workflow)
 
-        # Gather all decisions
-        all_decisions = []
-        all_files = []
-        agent_summaries = []
+    # Gather all decisions
+    all_decisions = []
+    all_files = []
+    agent_summaries = []
 
-        for agent_id, agent in workflow.get("agents", {}).items():
-            agent_summaries.append(f"**{agent_id}**: {agent.get('summary', 'No summary')}")
-            all_decisions.extend(agent.get("decisions", []))
-            all_files.extend(agent.get("files_modified", []))
+    for agent_id, agent in workflow.get("agents", {}).items():
+        agent_summaries.append(f"**{agent_id}**: {agent.get('summary', 'No summary')}")
+        all_decisions.extend(agent.get("decisions", []))
+        all_files.extend(agent.get("files_modified", []))
 
-        # Detect conflicts
-        conflicts = detect_conflicts(workflow)
+    # Detect conflicts
+    conflicts = detect_conflicts(workflow)
+    _review_conflicts[workflow_id] = (_file_identity(get_workflow_path(workflow_id)), len(conflicts))
 
-        # Build review report
-        report = [f"# Workflow Review: {workflow_id}"]
-        report.append(f"\n## Goal\n{workflow['description']}")
+    # Build review report
+    report = [f"# Workflow Review: {workflow_id}"]
+    report.append(f"\n## Goal\n{workflow['description']}")
 
-        report.append(f"\n## Agents ({len(workflow.get('agents', {}))} of {len(workflow.get('agents_planned', []))} completed)")
-        for summary in agent_summaries:
-            report.append(f"- {summary}")
+    report.append(f"\n## Agents ({len(workflow.get('agents', {}))} of {len(workflow.get('agents_planned', []))} completed)")
+    for summary in agent_summaries:
+        report.append(f"- {summary}")
 
-        report.append(f"\n## Decisions ({len(all_decisions)} total)")
-        for d in all_decisions:
+    report.append(f"\n## Decisions ({len(all_decisions)} total)")
+    for d in all_decisions:
+        if isinstance(d, str):
+            report.append(f"- {d}")  # Hook-extracted decisions are plain text
+        else:
             report.append(f"- [{d.get('type', 'unknown')}] {d.get('decision', 'No description')}")
 
-        report.append(f"\n## Files Modified ({len(set(all_files))} unique)")
-        for f in sorted(set(all_files)):
-            report.append(f"- {f}")
+    report.append(f"\n## Files Modified ({len(set(all_files))} unique)")
+    for f in sorted(set(all_files)):
+        report.append(f"- {f}")
 
-        if conflicts:
-            report.append(f"\n## CONFLICTS DETECTED ({len(conflicts)})")
-            for c in conflicts:
-                severity_icon = "🔴" if c["severity"] == "high" else "🟡"
-                report.append(f"{severity_icon} **{c['type']}**: {c['message']}")
-        else:
-            report.append("\n## No Conflicts Detected ✓")
-
-        report.append(f"\n---\nCall chitter_workflow_close('{workflow_id}') when done reviewing.")
-
-        return [TextContent(type="text", text="\n".join(report))]
-
-    elif name == "chitter_workflow_close":
-        workflow_id = arguments["workflow_id"]
-        workflow = load_workflow(workflow_id)
-
-        if not workflow:
-            return [TextContent(type="text", text=f"Workflow {workflow_id} not found")]
-
-        resolution_notes = arguments.get("resolution_notes", "")
-
-        # Log closure for potential Goldfish integration
-        closure_summary = {
-            "workflow_id": workflow_id,
-            "description": workflow["description"],
-            "agents_count": len(workflow.get("agents", {})),
-            "decisions_count": sum(len(a.get("decisions", [])) for a in workflow.get("agents", {}).values()),
-            "files_modified": list(set(
-                f for a in workflow.get("agents", {}).values()
-                for f in a.get("files_modified", [])
-            )),
-            "conflicts_found": len(detect_conflicts(workflow)),
-            "resolution_notes": resolution_notes,
-            "closed_at": datetime.now().isoformat()
-        }
+    if conflicts:
+        report.append(f"\n## CONFLICTS DETECTED ({len(conflicts)})")
+        for c in conflicts:
+            severity_icon = "🔴" if c["severity"] == "high" else "🟡"
+            report.append(f"{severity_icon} **{c['type']}**: {c['message']}")
+    else:
+        report.append("\n## No Conflicts Detected ✓")
 
-        # Delete the workflow file
-        delete_workflow(workflow_id)
+    report.append(f"\n---\nCall chitter_workflow_close('{workflow_id}') when done reviewing.")
 
-        return [TextContent(
-            type="text",
-            text=f"""Workflow {workflow_id} closed.
+    return [TextContent(type="text", text="\n".join(report))]
+
+
+def _handle_workflow_close(arguments: dict[str, Any], now: str, now_dt: datetime) -> list[TextContent]:
+    """Summarize and delete a reviewed workflow."""
+    workflow_id = arguments["workflow_id"]
+    workflow = load_workflow(workflow_id)
+
+    if not workflow:
+        return [TextContent(type="text", text=f"Workflow {workflow_id} not found")]
+
+    resolution_notes = arguments.get("resolution_notes", "")
+
+    # The review just counted conflicts; recount only if anything changed since
+    reviewed = _review_conflicts.pop(workflow_id, None)
+    if reviewed and reviewed[0] == _file_identity(get_workflow_path(workflow_id)):
+        conflicts_found = reviewed[1]
+    else:
+        conflicts_found = len(detect_conflicts(workflow))
+
+    # Totals for the summary, in one pass over the agents
+    agents = workflow.get("agents", {})
+    decisions_count = 0
+    files_modified = set()
+    for a in agents.values():
+        decisions_count += len(a.get("decisions", []))
+        files_modified.update(a.get("files_modified", []))
+
+    # Log closure for potential Goldfish integration
+    closure_summary = {
+        "workflow_id": workflow_id,
+        "description": workflow["description"],
+        "agents_count": len(agents),
+        "decisions_count": decisions_count,
+        "files_modified": list(files_modified),
+        "conflicts_found": conflicts_found,
+        "resolution_notes": resolution_notes,
+        "closed_at": now
+    }
+
+    # Delete the workflow file
+    delete_workflow(workflow_id)
+
+    return [TextContent(
+        type="text",
+        text=f"""Workflow {workflow_id} closed.
 
 Summary:
 - Agents: {closure_summary['agents_count']}
@@ -472,42 +615,44 @@ Summary:
 - Conflicts resolved: {closure_summary['conflicts_found']}
 
 Workflow state cleared."""
-        )]
-
-    elif name == "chitter_agent_start":
-        workflow_id = arguments["workflow_id"]
-        agent_id = arguments["agent_id"]
-        log(f"AGENT START: {agent_id} in {workflow_id} - {arguments['task_summary']}")
-        workflow = load_workflow(workflow_id)
-
-        if not workflow:
-            return [TextContent(type="text", text=f"Workflow {workflow_id} not found. Was it created with chitter_workflow_start?")]
-
-        workflow["agents"][agent_id] = {
-            "task": arguments["task_summary"],
-            "areas_of_concern": arguments["areas_of_concern"],
-            "status": "working",
-            "started_at": datetime.now().isoformat(),
-            "decisions": [],
-            "files_modified": [],
-            "summary": None
-        }
-        workflow["updated_at"] = datetime.now().isoformat()
-
-        save_workflow(workflow)
+    )]
+
+
+def _handle_agent_start(arguments: dict[str, Any], now: str, now_dt: datetime) -> list[TextContent]:
+    """Register an agent and its areas of concern in a workflow."""
+    workflow_id = arguments["workflow_id"]
+    agent_id = arguments["agent_id"]
+    log(f"AGENT START: {agent_id} in {workflow_id} - {arguments['task_summary']}", now_dt)
+    workflow = load_workflow(workflow_id)
+
+    if not workflow:
+        return [TextContent(type="text", text=f"Workflow {workflow_id} not found. Was it created with chitter_workflow_start?")]
+
+    workflow["agents"][agent_id] = {
+        "task": arguments["task_summary"],
+        "areas_of_concern": arguments["areas_of_concern"],
+        "status": "working",
+        "started_at": now,
+        "decisions": [],
+        "files_modified": [],
+        "summary": None
+    }
+    workflow["updated_at"] = now
+
+    save_workflow(workflow)
+
+    # Show what other agents are doing
+    other_agents = [
+        f"- {aid}: {a['task']} (areas: {', '.join(a['areas_of_concern'])})"
+        for aid, a in workflow["agents"].items()
+        if aid != agent_id
+    ]
 
-        # Show what other agents are doing
-        other_agents = [
-            f"- {aid}: {a['task']} (areas: {', '.join(a['areas_of_concern'])})"
-            for aid, a in workflow["agents"].items()
-            if aid != agent_id
-        ]
+    other_info = "\n".join(other_agents) if other_agents else "No other agents registered yet."
 
-        other_info = "\n".join(other_agents) if other_agents else "No other agents registered yet."
-
-        return [TextContent(
-            type="text",
-            text=f"""Registered in workflow {workflow_id}.
+    return [TextContent(
+        type="text",
+        text=f"""Registered in workflow {workflow_id}.
 
 Your task: {arguments['task_summary']}
 Your areas: {', '.join(arguments['areas_of_concern'])}
@@ -516,101 +661,120 @@ Other agents in this workflow:
 {other_info}
 
 Remember to call chitter_decision for key choices and chitter_complete when done."""
-        )]
+    )]
 
-    elif name == "chitter_decision":
-        workflow_id = arguments["workflow_id"]
-        agent_id = arguments["agent_id"]
-        log(f"DECISION: [{agent_id}] {arguments['decision_type']} - {arguments['decision'][:60]}")
-        workflow = load_workflow(workflow_id)
 
-        if not workflow:
-            return [TextContent(type="text", text=f"Workflow {workflow_id} not found")]
+def _handle_decision(arguments: dict[str, Any], now: str, now_dt: datetime) -> list[TextContent]:
+    """Record a decision made by a registered agent."""
+    workflow_id = arguments["workflow_id"]
+    agent_id = arguments["agent_id"]
+    log(f"DECISION: [{agent_id}] {arguments['decision_type']} - {arguments['decision'][:60]}", now_dt)
+    workflow = load_workflow(workflow_id)
 
-        if agent_id not in workflow["agents"]:
-            return [TextContent(type="text", text=f"Agent {agent_id} not registered. Call chitter_agent_start first.")]
+    if not workflow:
+        return [TextContent(type="text", text=f"Workflow {workflow_id} not found")]
 
-        decision = {
-            "type": arguments["decision_type"],
-            "decision": arguments["decision"],
-            "rationale": arguments.get("rationale", ""),
-            "timestamp": datetime.now().isoformat()
-        }
+    if agent_id not in workflow["agents"]:
+        return [TextContent(type="text", text=f"Agent {agent_id} not registered. Call chitter_agent_start first.")]
 
-        workflow["agents"][agent_id]["decisions"].append(decision)
-        workflow["updated_at"] = datetime.now().isoformat()
+    decision = {
+        "type": arguments["decision_type"],
+        "decision": arguments["decision"],
+        "rationale": arguments.get("rationale", ""),
+        "timestamp": now
+    }
 
-        save_workflow(workflow)
+    workflow["agents"][agent_id]["decisions"].append(decision)
+    workflow["updated_at"] = now
 
-        return [TextContent(
-            type="text",
-            text=f"Decision logged: [{arguments['decision_type']}] {arguments['decision']}"
-        )]
+    save_workflow(workflow)
 
-    elif name == "chitter_complete":
-        workflow_id = arguments["workflow_id"]
-        agent_id = arguments["agent_id"]
-        log(f"AGENT COMPLETE: {agent_id} - {arguments['summary'][:60]}")
-        workflow = load_workflow(workflow_id)
+    return [TextContent(
+        type="text",
+        text=f"Decision logged: [{arguments['decision_type']}] {arguments['decision']}"
+    )]
 
-        if not workflow:
-            return [TextContent(type="text", text=f"Workflow {workflow_id} not found")]
 
-        if agent_id not in workflow["agents"]:
-            return [TextContent(type="text", text=f"Agent {agent_id} not registered")]
+def _handle_complete(arguments: dict[str, Any], now: str, now_dt: datetime) -> list[TextContent]:
+    """Mark a registered agent complete with its summary and files."""
+    workflow_id = arguments["workflow_id"]
+    agent_id = arguments["agent_id"]
+    # Read every argument before editing the workflow, which is the cached dict
+    summary = arguments["summary"]
+    files_modified = arguments["files_modified"]
+    log(f"AGENT COMPLETE: {agent_id} - {summary[:60]}", now_dt)
+    workflow = load_workflow(workflow_id)
 
-        workflow["agents"][agent_id]["status"] = "complete"
-        workflow["agents"][agent_id]["completed_at"] = datetime.now().isoformat()
-        workflow["agents"][agent_id]["summary"] = arguments["summary"]
-        workflow["agents"][agent_id]["files_modified"] = arguments["files_modified"]
-        workflow["updated_at"] = datetime.now().isoformat()
+    if not workflow:
+        return [TextContent(type="text", text=f"Workflow {workflow_id} not found")]
 
-        save_workflow(workflow)
+    if agent_id not in workflow["agents"]:
+        return [TextContent(type="text", text=f"Agent {agent_id} not registered")]
 
-        # Check if all planned agents are complete
-        completed = sum(1 for a in workflow["agents"].values() if a["status"] == "complete")
-        planned = len(workflow.get("agents_planned", []))
+    workflow["agents"][agent_id]["status"] = "complete"
+    workflow["agents"][agent_id]["completed_at"] = now
+    workflow["agents"][agent_id]["summary"] = summary
+    workflow["agents"][agent_id]["files_modified"] = files_modified
+    workflow["updated_at"] = now
 
-        return [TextContent(
-            type="text",
-            text=f"""Task complete: {arguments['summary']}
-Files modified: {', '.join(arguments['files_modified']) or 'None'}
+    save_workflow(workflow)
+
+    # Check if all planned agents are complete
+    completed = sum(1 for a in workflow["agents"].values() if a["status"] == "complete")
+    planned = len(workflow.get("agents_planned", []))
+
+    return [TextContent(
+        type="text",
+        text=f"""Task complete: {summary}
+Files modified: {', '.join(files_modified) or 'None'}
 
 Progress: {completed}/{planned} agents complete."""
-        )]
+    )]
+
+
+def _handle_status(arguments: dict[str, Any], now: str, now_dt: datetime) -> list[TextContent]:
+    """Report every active workflow and its agents."""
+    workflows = get_active_workflows()
 
-    elif name == "chitter_status":
-        workflows = get_active_workflows()
+    if not workflows:
+        return [TextContent(
+            type="text",
+            text="No active workflows. Ready to start a new one with chitter_workflow_start."
+        )]
 
-        if not workflows:
-            return [TextContent(
-                type="text",
-                text="No active workflows. Ready to start a new one with chitter_workflow_start."
-            )]
+    report = [f"# Active Workflows ({len(workflows)})"]
 
-        report = [f"# Active Workflows ({len(workflows)})"]
+    for wf in workflows:
+        agents = wf.get("agents", {})
+        completed = sum(1 for a in agents.values() if a.get("status") == "complete")
+        total = len(agents)
+        planned = len(wf.get("agents_planned", []))
 
-        for wf in workflows:
-            agents = wf.get("agents", {})
-            completed = sum(1 for a in agents.values() if a.get("status") == "complete")
-            total = len(agents)
-            planned = len(wf.get("agents_planned", []))
+        report.append(f"\n## {wf['workflow_id']}")
+        report.append(f"**Goal:** {wf['description']}")
+        report.append(f"**Status:** {wf['status']}")
+        report.append(f"**Agents:** {completed}/{total} complete ({planned} planned)")
+        report.append(f"**Created:** {wf.get('created_at', 'unknown')}")
 
-            report.append(f"\n## {wf['workflow_id']}")
-            report.append(f"**Goal:** {wf['description']}")
-            report.append(f"**Status:** {wf['status']}")
-            report.append(f"**Agents:** {completed}/{total} complete ({planned} planned)")
-            report.append(f"**Created:** {wf.get('created_at', 'unknown')}")
+        if agents:
+            report.append("\n**Registered agents:**")
+            for aid, a in agents.items():
+                status_icon = "✓" if a.get("status") == "complete" else "⋯"
+                report.append(f"- {status_icon} {aid}: {a.get('task', 'No task')}")
 
-            if agents:
-                report.append("\n**Registered agents:**")
-                for aid, a in agents.items():
-                    status_icon = "✓" if a.get("status") == "complete" else "⋯"
-                    report.append(f"- {status_icon} {aid}: {a.get('task', 'No task')}")
+    return [TextContent(type="text", text="\n".join(report))]
 
-        return [TextContent(type="text", text="\n".join(report))]
 
-    return [TextContent(type="text", text=f"Unknown tool: {name}")]
+# Tool name -> handler; each gets the call's arguments and timestamps
+HANDLERS = {
+    "chitter_workflow_start": _handle_workflow_start,
+    "chitter_workflow_review": _handle_workflow_review,
+    "chitter_workflow_close": _handle_workflow_close,
+    "chitter_agent_start": _handle_agent_start,
+    "chitter_decision": _handle_decision,
+    "chitter_complete": _handle_complete,
+    "chitter_status": _handle_status,
+}
 
 
 async def main():
@@ -619,5 +783,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
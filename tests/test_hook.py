@@ -0,0 +1,39 @@
+"""Tests for hook.py's response parsing."""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# hook.py creates its state directories under ~/.chitter on import
+os.environ["HOME"] = tempfile.mkdtemp()
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import hook  # noqa: E402
+
+
+class ExtractActualContentTests(unittest.TestCase):
+    def test_null_text_part_is_skipped(self):
+        response = {"content": [{"type": "text", "text": None}]}
+        self.assertEqual(hook.extract_actual_content(response), "")
+
+    def test_non_str_text_part_is_skipped(self):
+        response = {"content": [{"type": "text", "text": 5}, {"type": "text", "text": "kept"}]}
+        self.assertEqual(hook.extract_actual_content(response), "kept")
+
+    def test_null_and_non_str_top_level_text(self):
+        self.assertEqual(hook.extract_actual_content({"text": None}), "")
+        self.assertEqual(hook.extract_actual_content({"text": {"nested": "x"}}), "")
+
+    def test_null_text_from_raw_json(self):
+        self.assertEqual(hook.extract_actual_content('{"content": [{"type": "text", "text": null}]}'), "")
+
+    def test_summary_and_decisions_tolerate_null_text(self):
+        for response in ({"content": [{"type": "text", "text": None}]}, {"text": None}, {"text": 5}):
+            self.assertEqual(hook.summarize_output(response), "")
+            self.assertEqual(hook.extract_decisions(response), [])
+
+
+if __name__ == "__main__":
+    unittest.main()